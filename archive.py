@@ -0,0 +1,112 @@
+import os
+import json
+import numpy as np
+import utils
+
+# Station archives of size distributions. Each station directory holds
+#   spectra.f32  dense float32 (time x size bin) array, row-major
+#   time.i8      datetime64[ns] timestamp of every row, sorted ascending
+#   meta.json    table and variables that define the columns of spectra.f32
+# Both arrays are read through memory maps, so slicing years of spectra does
+# not load them into memory, and new days are appended to the end of the files.
+archive_directory = os.path.join('.cache', 'archive')
+
+
+class Spectra(object):
+    # Memory-mapped pair of files: a dense float32 (time x size bin) array and
+    # the datetime64[ns] timestamp of every row, sorted ascending. Shared by the
+    # archive and the levels of pyramid.Pyramid.
+
+    def __init__(self, spectra_path, time_path, bins):
+        self.bins = bins
+        self._spectra_path = spectra_path
+        self._time_path = time_path
+        self._maps = None
+
+    def __len__(self):
+        return len(self.times)
+
+    @property
+    def times(self):
+        return self._map()[0]
+
+    @property
+    def spectra(self):
+        return self._map()[1]
+
+    def _map(self):
+        if self._maps is None:
+            n = 0
+            if os.path.exists(self._time_path) and os.path.exists(self._spectra_path):
+                # An interrupted write may leave one file longer than the other
+                n = min(os.path.getsize(self._time_path) // 8,
+                        os.path.getsize(self._spectra_path) // (4 * self.bins))
+            if n == 0:
+                self._maps = (np.empty(0, dtype='datetime64[ns]'), np.empty((0, self.bins), dtype=np.float32))
+            else:
+                times = np.memmap(self._time_path, dtype='datetime64[ns]', mode='r', shape=(n,))
+                spectra = np.memmap(self._spectra_path, dtype=np.float32, mode='r', shape=(n, self.bins))
+                self._maps = (times, spectra)
+        return self._maps
+
+    def write(self, n, times, spectra):
+        # Keep the first n rows and append times and spectra after them
+        self._maps = None
+        for path, values, size in ((self._spectra_path, spectra, 4 * self.bins), (self._time_path, times, 8)):
+            with open(path, 'ab') as f:
+                f.truncate(n * size)
+                f.write(np.ascontiguousarray(values).tobytes())
+
+    def slice(self, start, end):
+        # Timestamps and spectra in [start, end) as views into the memory maps
+        times = self.times
+        i = np.searchsorted(times, np.datetime64(start, 'ns'), side='left')
+        j = np.searchsorted(times, np.datetime64(end, 'ns'), side='left')
+        return times[i:j], self.spectra[i:j]
+
+
+class Archive(Spectra):
+
+    def __init__(self, place=None, directory=None):
+        self.place = place or utils.place
+        self.directory = os.path.join(directory or archive_directory, utils.configuration[self.place]['smear_table'])
+        self.variables = utils.configuration[self.place]['smear_variables'].split(',')
+        Spectra.__init__(self, os.path.join(self.directory, 'spectra.f32'), os.path.join(self.directory, 'time.i8'),
+                         len(self.variables))
+        self._meta_path = os.path.join(self.directory, 'meta.json')
+
+        os.makedirs(self.directory, exist_ok=True)
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                meta = json.load(f)
+            if meta['variables'] != self.variables:
+                raise ValueError('Archive variables do not match configuration [place = {}, directory = {}]'
+                                 .format(self.place, self.directory))
+        else:
+            with open(self._meta_path, 'w') as f:
+                json.dump({'table': utils.configuration[self.place]['smear_table'], 'variables': self.variables}, f)
+
+    def append(self, df):
+        # Append the rows of a data() or data_range() frame that are newer than the
+        # last archived row. Returns the number of rows appended.
+        times = df.index.values if df.index.dtype.kind == 'M' else utils._times(df).values
+        times = times.astype('datetime64[ns]')
+        spectra = utils.spectrum(df, self.place)
+
+        order = np.argsort(times, kind='stable')
+        times, spectra = times[order], spectra[order]
+        if len(self):
+            keep = times > self.times[-1]
+            times, spectra = times[keep], spectra[keep]
+        if len(times) > 1:
+            keep = np.concatenate(([True], times[1:] != times[:-1]))
+            times, spectra = times[keep], spectra[keep]
+        if len(times) == 0:
+            return 0
+
+        self.write(len(self), times, spectra)
+        return len(times)
+
+    def update(self, start, end, **kwargs):
+        # Fetch and append the days from start to end through utils.data_range()
+        return self.append(utils.data_range(start, end, self.place, **kwargs))
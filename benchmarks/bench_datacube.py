@@ -0,0 +1,75 @@
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+import numpy as np
+import pandas as pd
+from rdflib import Graph, URIRef, Literal
+from rdflib.namespace import RDF, RDFS
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'dev'))
+import datacube
+
+# Time and peak memory of producing RDF Data Cubes from a DataFrame:
+#   graph     building a Graph with iterrows() and a Literal per cell, as
+#             save_dataset() did before the streaming producer
+#   stream    consuming datacube.triples()
+#   write     datacube.write() to an N-Triples file
+#   python benchmarks/bench_datacube.py [cells ...]
+
+
+def synthetic_dataset(cells, columns=10, seed=0):
+    rng = np.random.RandomState(seed)
+    rows = cells // columns
+    data = {'Month': np.arange(rows) % 12 + 1}
+    for i in range(columns - 1):
+        data['Measure {}'.format(i)] = rng.rand(rows).round(3)
+    return pd.DataFrame(data)
+
+
+def graph(dataset):
+    gds = Graph()
+    dt = {column: URIRef('http://orkg.org/vocab/esuc/p{}'.format(i)) for i, column in enumerate(dataset.columns)}
+    ds = URIRef('http://orkg.org/vocab/esuc/ds')
+    for index, row in dataset.iterrows():
+        bno = URIRef('http://orkg.org/vocab/esuc/o{}'.format(index))
+        gds.add((bno, RDF.type, datacube.cube['Observation']))
+        gds.add((bno, RDFS.label, Literal('Observation #{}'.format(index + 1))))
+        gds.add((bno, datacube.cube['dataSet'], ds))
+        for column in dataset.columns:
+            gds.add((bno, dt[column], Literal(str(row[column]))))
+    return len(gds)
+
+
+def stream(dataset):
+    return sum(1 for _ in datacube.triples(dataset, 'Benchmark', ['Month']))
+
+
+def write(dataset):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'cube.nt')
+        datacube.write(dataset, 'Benchmark', ['Month'], path)
+        return os.path.getsize(path)
+
+
+def measure(function, dataset):
+    # Time without tracing, then peak memory in a traced second run
+    start = time.perf_counter()
+    result = function(dataset)
+    seconds = time.perf_counter() - start
+    tracemalloc.start()
+    function(dataset)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+if __name__ == '__main__':
+    sizes = [int(n) for n in sys.argv[1:]] or [10 ** 5, 10 ** 6]
+    for cells in sizes:
+        dataset = synthetic_dataset(cells)
+        functions = [stream, write] if cells > 10 ** 5 else [graph, stream, write]
+        for function in functions:
+            seconds, peak, _ = measure(function, dataset)
+            print('{:>9} cells  {:<7} {:8.2f} s  peak {:8.1f} MB'.format(cells, function.__name__, seconds, peak / 2 ** 20))
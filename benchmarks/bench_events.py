@@ -0,0 +1,58 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from rdflib import Graph
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import utils
+
+# Compare utils.add_events() with calling utils.event() once per event.
+#   python benchmarks/bench_events.py [number of events ...]
+
+
+def synthetic_events(n, seed=0):
+    rng = np.random.RandomState(seed)
+    days = pd.date_range('2000-01-01', periods=n, freq='D').strftime('%Y-%m-%d')
+    beginning = rng.randint(8 * 6, 13 * 6, n) * 10
+    duration = rng.randint(6, 7 * 6, n) * 10
+    end = beginning + duration
+    return pd.DataFrame({
+        'day': days,
+        'beginning': ['{:02d}:{:02d}'.format(m // 60, m % 60) for m in beginning],
+        'end': ['{:02d}:{:02d}'.format(m // 60, m % 60) for m in end],
+        'classification': rng.choice(['Class Ia', 'Class Ib', 'Class II'], n),
+        'place': rng.choice(['Hyytiälä', 'Puijo', 'Värriö'], n)
+    })
+
+
+def loop(df):
+    for row in df.itertuples(index=False):
+        utils.place = row.place
+        utils.event(row.day, row.beginning, row.end, row.classification)
+
+
+def bulk(df):
+    utils.add_events(df)
+
+
+def measure(function, df):
+    namespaces = list(utils.g.namespaces())
+    utils.g = Graph()
+    for prefix, namespace in namespaces:
+        utils.g.bind(prefix, namespace)
+    start = time.perf_counter()
+    function(df)
+    return time.perf_counter() - start, len(utils.g)
+
+
+if __name__ == '__main__':
+    sizes = [int(n) for n in sys.argv[1:]] or [1000, 10000]
+    for n in sizes:
+        df = synthetic_events(n)
+        loop_time, loop_triples = measure(loop, df)
+        bulk_time, bulk_triples = measure(bulk, df)
+        assert loop_triples == bulk_triples
+        print('{:>8} events  event() {:8.3f} s  add_events() {:8.3f} s  speedup {:5.1f}x  triples {}'
+              .format(n, loop_time, bulk_time, loop_time / bulk_time, bulk_triples))
@@ -0,0 +1,85 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import subprocess
+import numpy as np
+from mock_smear import MockSMEAR
+
+# Start-up cost of short-lived jobs: every scenario runs in a fresh interpreter
+# and reports the time to import the module, the time of its first call and
+# which heavy packages ended up loaded.
+#   fetch   import utils, one data() call against the mock SMEAR server
+#   graph   import utils, one event() and events()
+#   dev     import dev/utils, one generate_sid()
+# Compare with another checkout (e.g. a git worktree of an older commit) with
+#   python benchmarks/bench_import.py [--tree DIR ...] [--repeat 5] [--output results.json]
+
+root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+packages = ['pandas', 'matplotlib', 'rdflib', 'rdflib.plugins.sparql', 'orkg', 'shortid']
+
+scenarios = {
+    'fetch': ('', '''
+import utils
+utils.smear_url = sys.argv[1]
+utils.cache_directory = sys.argv[2]
+utils.data('2019-05-01')
+'''),
+    'graph': ('', '''
+import utils
+utils.event('2019-05-01', '10:00', '12:00', 'Class Ia')
+utils.events()
+'''),
+    'dev': ('dev', '''
+import utils
+utils.generate_sid()
+''')
+}
+
+template = '''
+import sys, time, json
+start = time.perf_counter()
+{imports}
+imported = time.perf_counter()
+{calls}
+done = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'first_call': done - imported,
+                  'loaded': [name for name in {packages!r} if name in sys.modules]}}))
+'''
+
+
+def run(tree, scenario, url, cache):
+    directory, code = scenarios[scenario]
+    lines = code.strip().splitlines()
+    script = template.format(imports=lines[0], calls='\n'.join(lines[1:]), packages=packages)
+    output = subprocess.check_output([sys.executable, '-c', script, url, cache], cwd=os.path.join(tree, directory))
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    arguments = argparse.ArgumentParser(description='Import time of the fetch-only, graph-only and dev paths')
+    arguments.add_argument('--tree', nargs='*', default=[root], help='checkouts to compare')
+    arguments.add_argument('--repeat', type=int, default=5)
+    arguments.add_argument('--output', help='JSON file')
+    options = arguments.parse_args()
+
+    server = MockSMEAR().start()
+    results = []
+    for tree in options.tree:
+        for scenario in scenarios:
+            runs = []
+            for _ in range(options.repeat):
+                with tempfile.TemporaryDirectory() as cache:
+                    runs.append(run(os.path.abspath(tree), scenario, server.url, cache))
+            result = {'tree': os.path.abspath(tree), 'scenario': scenario, 'repeat': options.repeat,
+                      'import': float(np.median([r['import'] for r in runs])),
+                      'first_call': float(np.median([r['first_call'] for r in runs])),
+                      'loaded': runs[-1]['loaded']}
+            results.append(result)
+            print('{:<40} {:<6} import {:6.3f} s  first call {:6.3f} s  loaded {}'.format(
+                tree[-40:], scenario, result['import'], result['first_call'], ', '.join(result['loaded'])))
+    server.stop()
+    if options.output:
+        with open(options.output, 'w') as f:
+            json.dump(results, f, indent=2)
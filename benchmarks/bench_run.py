@@ -0,0 +1,241 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import numpy as np
+import pandas as pd
+import rdflib
+from datetime import datetime
+from rdflib import Graph
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, root)
+import utils
+from mock_smear import MockSMEAR
+from mock_orkg import MockORKG
+from bench_events import synthetic_events
+from bench_upload import dev_utils, synthetic_dataset
+
+# Offline benchmark suite of the slowest paths, with SMEAR and ORKG replaced by
+# local mock servers and events by synthetic ones:
+#   data          utils.data() download and CSV parsing of N days, cold cache
+#   data_cached   utils.data() of N days from the cache
+#   spectrum      plot() matrix preparation of N days (utils.spectrum)
+#   draw          plot() drawing of one day on an Agg canvas
+#   event         N calls of utils.event()
+#   events        utils.events() on a graph of N events
+#   query         a utils.query() counting the events per place on N events
+#   duration      utils.duration() of the mean duration of N events
+#   store         dev/utils.store() of a data cube graph of N rows
+#   save_dataset  dev/utils.save_dataset() of N rows
+# Each benchmark is repeated and the results are written as JSON, to compare runs:
+#   python benchmarks/bench_run.py [--output results.json] [--repeat 3] [--quick]
+
+
+sizes = {
+    'data': [1, 7, 30],
+    'data_cached': [1, 7, 30],
+    'spectrum': [1, 30, 365],
+    'draw': [1],
+    'event': [100, 1000],
+    'events': [1000, 10000],
+    'query': [1000, 10000],
+    'duration': [1000, 10000],
+    'store': [12, 120],
+    'save_dataset': [12, 120, 1200]
+}
+quick_sizes = {name: values[:1] for name, values in sizes.items()}
+places = ['Hyytiälä', 'Puijo']
+
+
+def timed(function, setup=None, repeat=3):
+    # Wall times of repeat calls of function(state), state = setup() untimed
+    seconds = []
+    for _ in range(repeat):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        function(state)
+        seconds.append(time.perf_counter() - start)
+    return {'min': min(seconds), 'median': float(np.median(seconds)), 'repeat': repeat}
+
+
+def fresh_graph():
+    # An empty utils.g with the bindings of the original graph
+    namespaces = list(utils.g.namespaces())
+    utils.g = Graph()
+    for prefix, namespace in namespaces:
+        utils.g.bind(prefix, namespace)
+    return utils.g
+
+
+def graph_of_events(n):
+    fresh_graph()
+    utils.add_events(synthetic_events(n))
+    return utils.g
+
+
+def days(n):
+    return [day.strftime('%Y-%m-%d') for day in pd.date_range('2019-05-01', periods=n, freq='D')]
+
+
+def fetch_days(n, place, cached):
+    def setup():
+        if not cached:
+            shutil.rmtree(utils.cache_directory, ignore_errors=True)
+
+    def run(state):
+        for day in days(n):
+            utils.data(day)
+
+    utils.place = place
+    run(None)
+    return run, setup
+
+
+def bench_smear(repeat, sizes):
+    results = []
+    server = MockSMEAR().start()
+    directory = tempfile.mkdtemp()
+    smear_url, cache_directory, place = utils.smear_url, utils.cache_directory, utils.place
+    utils.smear_url, utils.cache_directory = server.url, os.path.join(directory, 'smear')
+    try:
+        for place_name in places:
+            table = utils.configuration[place_name]['smear_table']
+            for name, cached in (('data', False), ('data_cached', True)):
+                for n in sizes[name]:
+                    run, setup = fetch_days(n, place_name, cached)
+                    server.reset()
+                    result = timed(run, setup, repeat)
+                    results.append(dict(benchmark=name, table=table, size=n, unit='days', requests=server.total, **result))
+
+            utils.place = place_name
+            frames = [utils.data(day) for day in days(max(sizes['spectrum']))]
+            for n in sizes['spectrum']:
+                df = pd.concat(frames[:n], ignore_index=True)
+                result = timed(lambda state: utils.spectrum(df).T, repeat=repeat)
+                results.append(dict(benchmark='spectrum', table=table, size=n, unit='days', **result))
+
+            z = utils.spectrum(frames[0]).T
+
+            def draw(state):
+                figure = Figure(figsize=(10, 5), dpi=100)
+                FigureCanvasAgg(figure)
+                ax = figure.add_subplot(1, 1, 1)
+                figure.colorbar(utils._draw(ax, z, place_name))
+                figure.canvas.draw()
+            for n in sizes['draw']:
+                results.append(dict(benchmark='draw', table=table, size=n, unit='days', **timed(draw, repeat=repeat)))
+    finally:
+        utils.smear_url, utils.cache_directory, utils.place = smear_url, cache_directory, place
+        server.stop()
+        shutil.rmtree(directory, ignore_errors=True)
+    return results
+
+
+def bench_graph(repeat, sizes):
+    results = []
+    g, place = utils.g, utils.place
+    try:
+        for n in sizes['event']:
+            df = synthetic_events(n)
+
+            def insert(state):
+                for row in df.itertuples(index=False):
+                    utils.event(row.day, row.beginning, row.end, row.classification, place=row.place)
+            result = timed(insert, lambda: fresh_graph(), repeat)
+            results.append(dict(benchmark='event', size=n, unit='events', triples=len(utils.g), **result))
+
+        for n in sorted(set(sizes['events'] + sizes['query'] + sizes['duration'])):
+            graph_of_events(n)
+            # Every repetition evaluates the query, not a frame from the query cache
+            if n in sizes['events']:
+                result = timed(lambda state: utils.events(), utils.clear_query_cache, repeat)
+                results.append(dict(benchmark='events', size=n, unit='events', triples=len(utils.g), **result))
+            if n in sizes['query']:
+                q = """
+                SELECT ?place (COUNT(?uri) AS ?events)
+                WHERE {
+                ?uri rdf:type lode:Event .
+                ?uri lode:atPlace ?atPlace .
+                ?atPlace gn:name ?place .
+                }
+                GROUP BY ?place
+                """
+                result = timed(lambda state: utils.query(q, {'events': 'int'}), utils.clear_query_cache, repeat)
+                results.append(dict(benchmark='query', size=n, unit='events', triples=len(utils.g), **result))
+            if n in sizes['duration']:
+                df = utils.events()
+                value = float(((df.end - df.beginning).dt.total_seconds() / 3600).mean())
+                # duration() is content-addressed, so every repetition starts from the events only
+                result = timed(lambda state: utils.duration(value, df), lambda: graph_of_events(n), repeat)
+                results.append(dict(benchmark='duration', size=n, unit='events', **result))
+    finally:
+        utils.g, utils.place = g, place
+    return results
+
+
+def bench_orkg(repeat, sizes, latency):
+    results = []
+    dev = dev_utils()
+    server = MockORKG(latency=latency).start()
+    dev.host = server.host
+    try:
+        for n in sizes['store']:
+            g = dev.datacube.graph(synthetic_dataset(n), 'Benchmark', ['Month'])
+            server.reset()
+            result = timed(lambda state: dev.store(g), repeat=repeat)
+            results.append(dict(benchmark='store', size=n, unit='rows', requests=server.total // repeat, **result))
+        for n in sizes['save_dataset']:
+            dataset = synthetic_dataset(n)
+            server.reset()
+            result = timed(lambda state: dev.save_dataset(dataset, 'Benchmark', ['Month']), repeat=repeat)
+            results.append(dict(benchmark='save_dataset', size=n, unit='rows', requests=server.total // repeat, **result))
+    finally:
+        server.stop()
+    return results
+
+
+def environment():
+    return {
+        'time': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'rdflib': rdflib.__version__
+    }
+
+
+if __name__ == '__main__':
+    arguments = argparse.ArgumentParser(description='Run the benchmark suite and write the results as JSON')
+    arguments.add_argument('--output', help='JSON file, standard output if not given')
+    arguments.add_argument('--repeat', type=int, default=3)
+    arguments.add_argument('--latency', type=float, default=0.0, help='seconds added to each mock ORKG response')
+    arguments.add_argument('--quick', action='store_true', help='only the smallest size of each benchmark')
+    arguments.add_argument('--only', nargs='*', choices=['smear', 'graph', 'orkg'], default=['smear', 'graph', 'orkg'])
+    options = arguments.parse_args()
+
+    selected = quick_sizes if options.quick else sizes
+    results = []
+    if 'smear' in options.only:
+        results += bench_smear(options.repeat, selected)
+    if 'graph' in options.only:
+        results += bench_graph(options.repeat, selected)
+    if 'orkg' in options.only:
+        results += bench_orkg(options.repeat, selected, options.latency)
+    for result in results:
+        print('{:<13} {:>6} {:<6} {:9.4f} s'.format(result['benchmark'], result['size'], result['unit'], result['min']),
+              file=sys.stderr)
+
+    report = json.dumps({'environment': environment(), 'results': results}, indent=2)
+    if options.output:
+        with open(options.output, 'w') as f:
+            f.write(report)
+    else:
+        print(report)
@@ -0,0 +1,49 @@
+import os
+import sys
+import time
+import importlib.util
+import numpy as np
+import pandas as pd
+
+root = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(root, 'dev'))
+from mock_orkg import MockORKG
+
+# Request counts and wall time of dev/utils.save_dataset() against a local mock
+# ORKG with simulated latency, for several dataset sizes and worker counts.
+#   python benchmarks/bench_upload.py [latency in seconds]
+
+
+def dev_utils():
+    spec = importlib.util.spec_from_file_location('dev_utils', os.path.join(root, 'dev', 'utils.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def synthetic_dataset(rows, seed=0):
+    rng = np.random.RandomState(seed)
+    clock = lambda: ['{:02d}:{:02d}'.format(h, m) for h, m in zip(rng.randint(0, 24, rows), rng.randint(0, 60, rows))]
+    return pd.DataFrame({'Month': np.arange(1, rows + 1), 'Event start time': clock(), 'Event end time': clock(),
+                         'Duration': clock(), 'Sunrise': clock(), 'Sunset': clock()})
+
+
+def run(utils, server, dataset, workers):
+    server.reset()
+    utils.host = server.host
+    start = time.perf_counter()
+    utils.save_dataset(dataset, 'Benchmark', dimensions=['Month'], workers=workers)
+    return time.perf_counter() - start, server.total
+
+
+if __name__ == '__main__':
+    latency = float(sys.argv[1]) if len(sys.argv) > 1 else 0.002
+    utils = dev_utils()
+    server = MockORKG(latency=latency).start()
+    for rows in (12, 120):
+        dataset = synthetic_dataset(rows)
+        for workers in (1, 8, 32):
+            seconds, count = run(utils, server, dataset, workers)
+            print('{:>5} rows  {:>3} workers  {:>6} requests  {:8.3f} s'.format(rows, workers, count, seconds))
+    server.stop()
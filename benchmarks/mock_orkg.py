@@ -0,0 +1,117 @@
+import json
+import socket
+import re
+import time
+import threading
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# In-process stand-in for the ORKG REST API endpoints used by dev/utils:
+# classes, resources, predicates, literals, statements and papers. Every request
+# is counted per (method, endpoint), and `latency` seconds are added to each
+# response to imitate a remote server.
+#
+#   server = MockORKG(latency=0.005).start()
+#   dev_utils.host = server.host
+#   ...
+#   server.requests, server.stop()
+
+
+class MockORKG(object):
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.requests = Counter()
+        self.entities = {kind: dict() for kind in ('classes', 'resources', 'predicates', 'literals', 'statements', 'papers')}
+        self._lock = threading.Lock()
+        self._counter = 0
+        self._server = None
+
+    @property
+    def host(self):
+        return 'http://127.0.0.1:{}'.format(self._server.server_address[1])
+
+    @property
+    def total(self):
+        return sum(self.requests.values())
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+
+    def _new_id(self, kind, requested=None):
+        with self._lock:
+            self._counter += 1
+            return requested or '{}{}'.format(kind[0].upper(), self._counter)
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body=None):
+                data = json.dumps(body).encode() if body is not None else b''
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _route(self, method):
+                url = urlparse(self.path)
+                match = re.match(r'^/api/(\w+)/(?:([^/]+)/)?$', url.path)
+                length = int(self.headers.get('Content-Length') or 0)
+                body = json.loads(self.rfile.read(length).decode()) if length else {}
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if not match or match.group(1) not in mock.entities:
+                    return self._reply(404, {'error': 'not found'})
+                kind, entity_id = match.group(1), match.group(2)
+                with mock._lock:
+                    mock.requests[(method, kind)] += 1
+                    fail = mock.failure_rate and (mock.total % int(1 / mock.failure_rate) == 0)
+                if fail:
+                    return self._reply(503, {'error': 'unavailable'})
+                entities = mock.entities[kind]
+                if method == 'GET' and entity_id:
+                    if entity_id in entities:
+                        return self._reply(200, entities[entity_id])
+                    return self._reply(404, {'error': 'not found'})
+                if method == 'GET':
+                    q = parse_qs(url.query).get('q', [None])[0]
+                    with mock._lock:
+                        found = [e for e in entities.values() if e.get('label') == q]
+                    return self._reply(200, found)
+                entity = dict(body)
+                entity['id'] = mock._new_id(kind, body.get('id'))
+                with mock._lock:
+                    entities[entity['id']] = entity
+                return self._reply(201, entity)
+
+            def do_GET(self):
+                self._route('GET')
+
+            def do_POST(self):
+                self._route('POST')
+
+        return Handler
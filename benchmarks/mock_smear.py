@@ -0,0 +1,138 @@
+import time
+import socket
+import threading
+import numpy as np
+import pandas as pd
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+# In-process stand-in for the SMEAR smeardata.jsp service used by utils.data().
+# Replies are synthetic DMPS size distributions in the layout of the SMEAR CSV
+# export: Year, Month, Day, Hour, Minute, Second and one <table>.<variable>
+# column per size bin, every 10 minutes. The same query always gets the same
+# reply, so benchmark runs are comparable.
+#
+#   server = MockSMEAR().start()
+#   utils.smear_url = server.url
+#   ...
+#   server.requests, server.stop()
+
+
+def smear_csv(table, variables, time_from, time_to, seed=0):
+    # CSV text of a synthetic day (or any period) of the given table and variables,
+    # e.g. smear_csv('HYY_DMPS', 'd316e1,d355e1', '2019-05-01', '2019-05-02')
+    variables = variables.split(',')
+    times = _times(pd.Timestamp(time_from).tz_localize(None), pd.Timestamp(time_to).tz_localize(None))
+    rng = np.random.RandomState(seed)
+    n, m = len(times), len(variables)
+    # Background distribution with noise, and a growing mode starting at the
+    # smallest sizes in the morning of every day
+    hours = (times.hour + times.minute / 60.0).values
+    mode = np.clip((hours - 9) * m / 12.0, -m, None)[:, None]
+    bins = np.arange(m)[None, :]
+    values = 1000 * np.exp(-((bins - m * 0.6) / (m / 4.0)) ** 2) + 5000 * np.exp(-((bins - mode) / 2.0) ** 2) * (mode >= 0)
+    values = values * rng.lognormal(0, 0.2, (n, m))
+    df = pd.DataFrame(values.round(1), columns=['{}.{}'.format(table, variable) for variable in variables])
+    for column, values in reversed(list(zip(['Year', 'Month', 'Day', 'Hour', 'Minute', 'Second'],
+                                            [times.year, times.month, times.day, times.hour, times.minute, times.second]))):
+        df.insert(0, column, values)
+    return df.to_csv(index=False)
+
+
+def _times(start, end):
+    # Local times of the records in [start, end). pandas < 1.4 names the interval
+    # argument of date_range() closed.
+    try:
+        return pd.date_range(start, end, freq='10min', inclusive='left')
+    except TypeError:
+        return pd.date_range(start, end, freq='10min', closed='left')
+
+
+class MockSMEAR(object):
+
+    def __init__(self, latency=0.0, failure_rate=0.0):
+        self.latency = latency
+        # Every 1 / failure_rate-th request gets a 503 reply
+        self.failure_rate = failure_rate
+        self.failures = 0
+        self.requests = Counter()
+        self._calls = 0
+        self._replies = dict()
+        self._lock = threading.Lock()
+        self._server = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/smeardata.jsp'.format(self._server.server_address[1])
+
+    @property
+    def total(self):
+        return sum(self.requests.values())
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset(self):
+        with self._lock:
+            self.requests.clear()
+
+    def reply(self, query):
+        key = tuple(query.get(name) for name in ('table', 'variables', 'from', 'to'))
+        with self._lock:
+            self.requests[query.get('table')] += 1
+            body = self._replies.get(key)
+        if body is None:
+            body = smear_csv(*key).encode()
+            with self._lock:
+                self._replies[key] = body
+        return body
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                BaseHTTPRequestHandler.setup(self)
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                query = {name: values[0] for name, values in parse_qs(urlparse(self.path).query).items()}
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if not {'table', 'variables', 'from', 'to'} <= set(query):
+                    self.send_response(400)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                with mock._lock:
+                    mock._calls += 1
+                    fail = mock.failure_rate and mock._calls % int(1 / mock.failure_rate) == 0
+                    mock.failures += 1 if fail else 0
+                if fail:
+                    self.send_response(503)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = mock.reply(query)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/csv')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST
+
+        return Handler
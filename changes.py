@@ -0,0 +1,223 @@
+import io
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+
+# Change tracking of graphs for incremental exports. Once track() is called for
+# a graph, every triple added to (and not already in) or removed from its store
+# is journaled, and each write of utils (event(), add_events(), duration(),
+# parse(), parse_many()) closes a numbered checkpoint when it commits. A
+# consumer keeps the number of its last pull and exports only what changed
+# since, at a cost proportional to the changes rather than the graph:
+#
+#   since = changes.track()                      # before the first full export
+#   utils.graph().serialize('full.nt', format='nt')
+#   ...
+#   since = changes.export(since, 'added.nt', 'removed.nt')
+#
+# The journal is kept in memory, so checkpoints do not survive a restart and a
+# consumer then starts over with a full export. Removals are journaled from the
+# store events, which the SQLite store dispatches but the rdflib memory store
+# does not; remove() journals them for any store.
+_journals = weakref.WeakKeyDictionary()
+_lock = threading.Lock()
+
+
+class Journal(object):
+
+    def __init__(self):
+        # (added, s, p, o, context identifier) per change, in order
+        self.entries = []
+        # Position in entries of every checkpoint; positions count the entries
+        # dropped by compact() in offset
+        self.checkpoints = [0]
+        self.offset = 0
+        self.first = 0
+        self.lock = threading.Lock()
+
+    def record(self, added, triple, context):
+        s, p, o = triple
+        self.entries.append((added, s, p, o, getattr(context, 'identifier', context)))
+
+    def cut(self):
+        # Number of the checkpoint after the last change, closing a new one if
+        # there were changes since the previous checkpoint
+        with self.lock:
+            position = self.offset + len(self.entries)
+            if position > self.checkpoints[-1]:
+                self.checkpoints.append(position)
+            return self.first + len(self.checkpoints) - 1
+
+    def changes(self, since):
+        # Net changes after checkpoint since as (added, s, p, o, context); a quad
+        # added and later removed, or the reverse, counts by its last change
+        with self.lock:
+            if since < self.first or since > self.first + len(self.checkpoints) - 1:
+                raise LookupError('Checkpoint not in journal [checkpoint = {}, first = {}, last = {}]'
+                                  .format(since, self.first, self.first + len(self.checkpoints) - 1))
+            entries = self.entries[self.checkpoints[since - self.first] - self.offset:]
+        net = OrderedDict()
+        for added, s, p, o, c in entries:
+            net.pop((s, p, o, c), None)
+            net[(s, p, o, c)] = added
+        return net
+
+
+def track(graph=None):
+    # Start journaling the changes of graph (g by default) and return the number
+    # of the current checkpoint
+    import utils
+    from rdflib.store import TripleAddedEvent, TripleRemovedEvent
+    graph = utils._target(graph)
+    store = graph.store
+    with _lock:
+        journal = _journals.get(store)
+        if journal is None:
+            journal = _journals[store] = Journal()
+
+            def added(event):
+                # Stores dispatch the event before the insert, so a quad found
+                # here is a re-assertion and no change
+                for _ in store.triples(event.triple, event.context):
+                    return
+                journal.record(True, event.triple, event.context)
+            store.dispatcher.subscribe(TripleAddedEvent, added)
+            store.dispatcher.subscribe(TripleRemovedEvent,
+                                       lambda event: journal.record(False, event.triple, event.context))
+    return journal.cut()
+
+
+def checkpoint(graph=None):
+    # Close a checkpoint after the changes so far and return its number
+    import utils
+    return _journal(utils._target(graph)).cut()
+
+
+def commit(graph):
+    # Called by the writes of utils: a checkpoint per write of a tracked graph
+    journal = _journals.get(graph.store)
+    if journal is not None:
+        journal.cut()
+
+
+def rollback(graph):
+    # Called by the writes of utils when their transaction is rolled back: drop
+    # the changes after the last checkpoint, they were never committed
+    journal = _journals.get(graph.store)
+    if journal is not None:
+        with journal.lock:
+            del journal.entries[journal.checkpoints[-1] - journal.offset:]
+
+
+def remove(triple, graph=None):
+    # Remove the triples matching triple from graph, journaling them also for
+    # stores that do not dispatch removals. Like the writes of utils, a failed
+    # removal is rolled back.
+    import utils
+    return utils._transaction(_remove)(triple, graph=graph)
+
+
+def _remove(triple, graph=None):
+    import utils
+    graph = utils._target(graph)
+    journal = _journals.get(graph.store)
+    removed = list(graph.triples(triple))
+    graph.remove(triple)
+    if journal is not None:
+        for found in removed:
+            journal.record(False, found, graph)
+    # The removed triples may be events of the interval index, as after parse()
+    utils._drop_index(graph)
+    utils._commit(graph)
+    return len(removed)
+
+
+def compact(before, graph=None):
+    # Drop the journal up to checkpoint before; older checkpoints can no longer
+    # be exported from
+    import utils
+    journal = _journal(utils._target(graph))
+    with journal.lock:
+        if before <= journal.first:
+            return
+        before = min(before, journal.first + len(journal.checkpoints) - 1)
+        position = journal.checkpoints[before - journal.first]
+        del journal.entries[:position - journal.offset]
+        del journal.checkpoints[:before - journal.first]
+        journal.offset, journal.first = position, before
+
+
+def export(since, added, removed=None, format='nt', graph=None):
+    # Write the triples added and removed since checkpoint since to added and
+    # removed (paths or text files) as N-Triples ('nt', the triples of graph) or
+    # N-Quads ('nquads', the quads of its store). Returns the number of the
+    # checkpoint the export is complete up to, the since of the next export.
+    import utils
+    from rdflib.plugins.serializers.nt import _nt_row
+    from rdflib.plugins.serializers.nquads import _nq_row
+    if format not in ('nt', 'nquads'):
+        raise ValueError('Unsupported export format [format = {}]'.format(format))
+    graph = utils._target(graph)
+    journal = _journal(graph)
+    until = journal.cut()
+    net = journal.changes(since)
+
+    files = [_open(added), _open(removed) if removed is not None else None]
+    try:
+        for (s, p, o, c), is_added in net.items():
+            f = files[0] if is_added else files[1]
+            if f is None:
+                continue
+            if format == 'nt':
+                if c is None or c == graph.identifier:
+                    f[0].write(_nt_row((s, p, o)))
+            else:
+                f[0].write(_nq_row((s, p, o), c) if c is not None else _nt_row((s, p, o)))
+    finally:
+        for f in files:
+            if f is not None and f[1]:
+                f[0].close()
+    return until
+
+
+def _journal(graph):
+    journal = _journals.get(graph.store)
+    if journal is None:
+        raise LookupError('Graph changes are not tracked, call changes.track() first')
+    return journal
+
+
+def _open(target):
+    # Text file of target and whether it is to be closed here
+    if isinstance(target, (str, bytes)) or hasattr(target, '__fspath__'):
+        return io.open(target, 'w', encoding='utf-8'), True
+    return target, False
+
+
+def save_events(path, graph=None, **filters):
+    # Write events() (with the place, start and end filters of events()) to a
+    # columnar .npz file: times as int64 UTC nanoseconds, repeated strings as
+    # int32 codes into a table of their values
+    import utils
+    df = utils.events(graph, **filters)
+    columns = dict()
+    for column in ('beginning', 'end'):
+        columns[column] = df[column].values.astype('datetime64[ns]').view(np.int64)
+    for column in ('place', 'classification', 'uri'):
+        codes, values = pd.factorize(df[column])
+        columns['{}_codes'.format(column)] = codes.astype(np.int32)
+        columns['{}_values'.format(column)] = np.asarray(values, dtype=str)
+    np.savez(path, **columns)
+    return len(df)
+
+
+def load_events(path):
+    # events() frame of a file written by save_events()
+    with np.load(path) as f:
+        df = pd.DataFrame({column: f['{}_values'.format(column)][f['{}_codes'.format(column)]].astype(object)
+                           for column in ('place', 'classification', 'uri')})
+        for column in ('beginning', 'end'):
+            df[column] = pd.to_datetime(f[column], utc=True).tz_convert('Europe/Helsinki')
+    return df[['place', 'beginning', 'end', 'classification', 'uri']]
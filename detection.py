@@ -0,0 +1,125 @@
+import numpy as np
+import pandas as pd
+import utils
+
+# Automatic detection of new particle formation events. The spectra of all days
+# are arranged in a (day x time slot x size bin) cube and scanned at once:
+#   1. The concentration in the num_var_less_than_10nm smallest bins is smoothed
+#      over an hour and compared to the day's background level.
+#   2. The longest daytime run above `threshold` times the background is the
+#      candidate event, if it lasts at least `min_duration`.
+#   3. The growth of the nucleation mode is the slope of the diameter of maximum
+#      concentration over the candidate window.
+# Candidates with growth and a strong rise are proposed as Class Ia, with growth
+# only as Class Ib and without growth as Class II.
+
+threshold = 3.0
+strong = 10.0
+min_duration = pd.Timedelta('1h')
+daylight = ('04:00', '20:00')
+
+
+def detect(df, place=None, step='10min'):
+    # Candidate events in a time-indexed data_range() frame
+    place = place or utils.place
+    times = df.index if df.index.dtype.kind == 'M' else utils._times(df)
+    return detect_arrays(times.values, utils.spectrum(df, place), place, step)
+
+
+def detect_arrays(times, spectra, place=None, step='10min'):
+    # Candidate events in a (time x size bin) array, e.g. from archive.Archive.slice()
+    place = place or utils.place
+    step = pd.Timedelta(step)
+    slots = int(pd.Timedelta('1D') / step)
+    columns = ['day', 'beginning', 'end', 'classification', 'place', 'ratio', 'growth']
+    times = np.asarray(times, dtype='datetime64[ns]')
+    if len(times) == 0:
+        return pd.DataFrame(columns=columns)
+
+    # Arrange the spectra in a (day x slot x bin) cube, leaving gaps as nan
+    days = times.astype('datetime64[D]')
+    first = days.min()
+    day_index = (days - first).astype(np.int64)
+    slot_index = ((times - days) // step.to_timedelta64()).astype(np.int64)
+    cube = np.full((day_index.max() + 1, slots, spectra.shape[1]), np.nan, dtype=np.float32)
+    cube[day_index, slot_index] = spectra
+
+    k = utils.configuration[place]['num_var_less_than_10nm']
+    small = _moving_mean(np.nansum(cube[:, :, :k], axis=2), int(pd.Timedelta('1h') / step))
+    small[np.isnan(cube[:, :, :k]).all(axis=2)] = np.nan
+    with np.errstate(all='ignore'):
+        background = np.nanpercentile(small, 10, axis=1)[:, np.newaxis]
+        ratio = small / np.maximum(background, 1.0)
+
+    slot_of_day = np.arange(slots) * step
+    light = (slot_of_day >= pd.Timedelta(daylight[0] + ':00')) & (slot_of_day <= pd.Timedelta(daylight[1] + ':00'))
+    active = (ratio >= threshold) & light[np.newaxis, :]
+
+    rows, start, end = _longest_runs(active)
+    keep = (end - start) * step >= min_duration
+    rows, start, end = rows[keep], start[keep], end[keep]
+    if len(rows) == 0:
+        return pd.DataFrame(columns=columns)
+
+    window = np.zeros((len(rows), slots), dtype=bool)
+    span = np.arange(slots)[np.newaxis, :]
+    window[(span >= start[:, np.newaxis]) & (span < end[:, np.newaxis])] = True
+
+    peak = np.nanmax(np.where(window, ratio[rows], np.nan), axis=1)
+    # Channels without a diameter in their name (Puijo's ch01...) are ordered by
+    # size too, so the bin index gives the sign of growth, in bins per hour
+    diameters = utils.diameters(place)[:2 * k]
+    if np.isnan(diameters).any():
+        diameters = np.arange(len(diameters), dtype=np.float64)
+    hours = np.arange(slots) * (step / pd.Timedelta('1h'))
+    growth = np.nan_to_num(utils._slopes(hours, utils._modes(cube[rows, :, :2 * k], diameters), window))
+
+    classification = np.where(growth > 0, np.where(peak >= strong, 'Class Ia', 'Class Ib'), 'Class II')
+    day_labels = (first + rows).astype(str)
+
+    return pd.DataFrame({
+        'day': day_labels,
+        'beginning': _clock(start, step),
+        'end': _clock(np.minimum(end, slots - 1), step),
+        'classification': classification,
+        'place': place,
+        'ratio': peak,
+        'growth': growth
+    }, columns=columns)
+
+
+def annotate(candidates, graph=None):
+    # Record candidate events in g (or graph) through utils.add_events(), each
+    # at its own place
+    utils.add_events(candidates[['day', 'beginning', 'end', 'classification', 'place']], graph=graph)
+
+
+def _clock(slots, step):
+    minutes = (slots * (step / pd.Timedelta('1min'))).astype(np.int64)
+    return ['{:02d}:{:02d}'.format(m // 60, m % 60) for m in minutes]
+
+
+def _moving_mean(x, width):
+    # Trailing moving mean along axis 1 that ignores nan
+    valid = ~np.isnan(x)
+    total = np.cumsum(np.where(valid, x, 0), axis=1)
+    count = np.cumsum(valid, axis=1)
+    total[:, width:] = total[:, width:] - total[:, :-width]
+    count[:, width:] = count[:, width:] - count[:, :-width]
+    with np.errstate(all='ignore'):
+        return np.where(count > 0, total / count, np.nan)
+
+
+def _longest_runs(active):
+    # Row, start and (exclusive) end of the longest run of True in each row
+    padded = np.zeros((active.shape[0], active.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = active
+    edges = np.diff(padded, axis=1)
+    start_rows, starts = np.nonzero(edges == 1)
+    _, ends = np.nonzero(edges == -1)
+    if len(starts) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    order = np.lexsort((starts - ends, start_rows))
+    rows, first = np.unique(start_rows[order], return_index=True)
+    return rows, starts[order][first], ends[order][first]
@@ -0,0 +1,150 @@
+import numpy as np
+import pandas as pd
+from hashlib import md5
+from rdflib import Graph, URIRef, Literal
+from rdflib.namespace import RDF, RDFS
+
+'''
+Streaming RDF Data Cube producer for DataFrames. triples() yields the cube of
+a dataset one statement at a time, so it can be uploaded or written without
+building a Graph of the whole cube. A node's rdf:type and rdfs:label statements
+are yielded before any statement that uses it, which lets a streaming consumer
+such as upload.Uploader.stream() resolve nodes as they come.
+
+Node IDs are the hash of the dataset followed by a role and a position, e.g.
+<prefix>o41 for the 42nd observation, so they are collision-free within a cube,
+need no random generator and are stable across saves of the same dataset.
+'''
+
+# The RDF Data Cube Vocabulary index
+cube = dict()
+cube['DataSet'] = URIRef('http://purl.org/linked-data/cube#DataSet')
+cube['DataStructureDefinition'] = URIRef('http://purl.org/linked-data/cube#DataStructureDefinition')
+cube['Observation'] = URIRef('http://purl.org/linked-data/cube#Observation')
+cube['ComponentSpecification'] = URIRef('http://purl.org/linked-data/cube#ComponentSpecification')
+cube['ComponentProperty'] = URIRef('http://purl.org/linked-data/cube#ComponentProperty')
+cube['DimensionProperty'] = URIRef('http://purl.org/linked-data/cube#DimensionProperty')
+cube['MeasureProperty'] = URIRef('http://purl.org/linked-data/cube#MeasureProperty')
+cube['AttributeProperty'] = URIRef('http://purl.org/linked-data/cube#AttributeProperty')
+cube['dataSet'] = URIRef('http://purl.org/linked-data/cube#dataSet')
+cube['structure'] = URIRef('http://purl.org/linked-data/cube#structure')
+cube['component'] = URIRef('http://purl.org/linked-data/cube#component')
+cube['componentProperty'] = URIRef('http://purl.org/linked-data/cube#componentProperty')
+cube['componentAttachment'] = URIRef('http://purl.org/linked-data/cube#componentAttachment')
+cube['dimension'] = URIRef('http://purl.org/linked-data/cube#dimension')
+cube['attribute'] = URIRef('http://purl.org/linked-data/cube#attribute')
+cube['measure'] = URIRef('http://purl.org/linked-data/cube#measure')
+cube['order'] = URIRef('http://purl.org/linked-data/cube#order')
+# Vocabulary Classes
+cube_classes = [cube['DataSet'],cube['DataStructureDefinition'],cube['Observation'],cube['ComponentSpecification'],
+              cube['ComponentProperty'],cube['DimensionProperty'],cube['MeasureProperty'],cube['AttributeProperty']]
+
+vocabulary_labels = [(RDF.type, 'type'), (RDFS.label, 'label'), (cube['dataSet'], 'dataSet'),
+                     (cube['structure'], 'structure'), (cube['component'], 'component'),
+                     (cube['componentProperty'], 'component Property'),
+                     (cube['componentAttachment'], 'component Attachment'), (cube['dimension'], 'dimension'),
+                     (cube['attribute'], 'attribute'), (cube['measure'], 'measure'), (cube['order'], 'order')]
+
+
+def prefix(dataset, title, dimensions):
+    digest = md5('{}|{}|{}'.format(title, sorted(dimensions), list(dataset.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(dataset, index=True).values.tobytes())
+    return 'http://orkg.org/vocab/esuc/d{}'.format(digest.hexdigest()[:16])
+
+
+def dataset_node(dataset, title, dimensions):
+    return URIRef('{}ds'.format(prefix(dataset, title, dimensions)))
+
+
+def triples(dataset, title, dimensions):
+    p = prefix(dataset, title, dimensions)
+    for triple in _header(dataset, title, dimensions, p):
+        yield triple
+    for triple in _observations(dataset, p):
+        yield triple
+
+
+def _header(dataset, title, dimensions, p):
+    ds = URIRef('{}ds'.format(p)) # theDataset
+    dsd = URIRef('{}dsd'.format(p)) # theDataStructureDefinition
+
+    for term, label in vocabulary_labels:
+        yield term, RDFS.label, Literal(label)
+
+    yield ds, RDF.type, cube['DataSet']
+    yield ds, RDFS.label, Literal(str(title))
+    yield dsd, RDF.type, cube['DataStructureDefinition']
+    yield dsd, RDFS.label, Literal('Data Structure Definition ESUC')
+    yield ds, cube['structure'], dsd
+
+    for index, column in enumerate(dataset.columns, start=1):
+        cs = URIRef('{}c{}'.format(p, index))
+        dt = URIRef('{}p{}'.format(p, index))
+        yield cs, RDF.type, cube['ComponentSpecification']
+        yield cs, RDFS.label, Literal('Component Specification ' + column)
+        yield dt, RDF.type, cube['DimensionProperty'] if column in dimensions else cube['MeasureProperty']
+        yield dt, RDF.type, cube['ComponentProperty']
+        yield dt, RDFS.label, Literal(column)
+        yield dsd, cube['component'], cs
+        yield cs, cube['order'], Literal(index)
+        yield cs, cube['dimension'] if column in dimensions else cube['measure'], dt
+
+
+def _observations(dataset, p):
+    ds = URIRef('{}ds'.format(p))
+    dt = [URIRef('{}p{}'.format(p, index)) for index in range(1, len(dataset.columns) + 1)]
+    # One string array per column instead of one object per cell
+    values = [dataset[column].astype(str).values for column in dataset.columns]
+    labels = ['Observation #{}'.format(index + 1) for index in dataset.index]
+    for position, label in enumerate(labels):
+        observation = URIRef('{}o{}'.format(p, position))
+        yield observation, RDF.type, cube['Observation']
+        yield observation, RDFS.label, Literal(label)
+        yield observation, cube['dataSet'], ds
+        for predicate, column_values in zip(dt, values):
+            yield observation, predicate, Literal(column_values[position])
+
+
+def graph(dataset, title, dimensions):
+    gds = Graph()
+    gds.bind('orkg', 'http://orkg.org/vocab/')
+    gds.bind('esuc', 'http://orkg.org/vocab/esuc/')
+    gds.bind('qb', 'http://purl.org/linked-data/cube#')
+    gds.addN((s, p, o, gds) for s, p, o in triples(dataset, title, dimensions))
+    return gds
+
+
+def write(dataset, title, dimensions, path, chunk_size=20000):
+    # Write the cube as N-Triples. Observation statements are formatted a chunk of
+    # rows at a time with vectorized string operations.
+    p = prefix(dataset, title, dimensions)
+    n = len(dataset)
+    columns = list(dataset.columns)
+    with open(path, 'w', encoding='utf-8') as f:
+        for triple in _header(dataset, title, dimensions, p):
+            f.write('{} {} {} .\n'.format(*[term.n3() for term in triple]))
+
+        ds = URIRef('{}ds'.format(p)).n3()
+        for start in range(0, n, chunk_size):
+            chunk = dataset.iloc[start:start + chunk_size]
+            subjects = pd.Series(np.arange(start, start + len(chunk)).astype(str))
+            subjects = ('<{}o'.format(p) + subjects + '>').values
+            labels = pd.Series(['Observation #{}'.format(index + 1) for index in chunk.index])
+            lines = [subjects + ' {} {} .\n'.format(RDF.type.n3(), cube['Observation'].n3()),
+                     subjects + ' {} '.format(RDFS.label.n3()) + _quoted(labels, escape=False) + ' .\n',
+                     subjects + ' {} {} .\n'.format(cube['dataSet'].n3(), ds)]
+            for index, column in enumerate(columns, start=1):
+                predicate = URIRef('{}p{}'.format(p, index)).n3()
+                # Only text columns can contain characters that need escaping
+                escape = chunk[column].dtype == object
+                lines.append(subjects + ' {} '.format(predicate) +
+                             _quoted(chunk[column].astype(str).reset_index(drop=True), escape) + ' .\n')
+            f.write(''.join(np.stack(lines, axis=1).ravel()))
+
+
+def _quoted(values, escape=True):
+    if not escape:
+        return ('"' + values + '"').values
+    escaped = values.str.replace('\\', '\\\\', regex=False).str.replace('"', '\\"', regex=False) \
+        .str.replace('\n', '\\n', regex=False).str.replace('\r', '\\r', regex=False)
+    return ('"' + escaped + '"').values
@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from rdflib import Literal, URIRef
+from rdflib.namespace import RDF, RDFS
+# metrics and sessions are modules of the repository root, above dev/
+root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+if root not in sys.path:
+    sys.path.append(root)
+import metrics
+import sessions
+
+'''
+Upload engine for ORKG statements. Uploading a graph runs in dependency order,
+with the requests of each phase spread over a bounded pool of workers that
+share one pooled HTTP session:
+  1. classes      each distinct class is looked up (or created) once
+  2. predicates   each distinct predicate is resolved once; predicates that are
+                  typed resources (e.g. qb:DimensionProperty) first get their resource
+  3. resources    each distinct subject, object and literal is created once
+  4. statements   one statement per triple, using the ids of phases 2 and 3
+Failed requests are retried with exponential backoff.
+
+With a Journal, every id the server assigns and every statement it creates is
+appended to a file as soon as the request succeeds. An interrupted upload is
+resumed by uploading again with the same journal: known classes, predicates and
+nodes are not created again and recorded statements are skipped, so uploading
+an unchanged graph sends no requests at all.
+'''
+
+
+class Journal(object):
+    # Append-only JSON lines file mapping classes, predicates and nodes (N3) to
+    # ORKG ids, and listing created statements as [subject, predicate, object] ids
+
+    def __init__(self, path, host):
+        self.path = path
+        self.classes = dict()
+        self.predicates = dict()
+        self.nodes = dict()
+        self.statements = set()
+        self._lock = threading.Lock()
+
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    entry = json.loads(line)
+                    if 'host' in entry:
+                        if entry['host'] != host:
+                            raise Exception('Journal {} belongs to host {}, not {}'.format(path, entry['host'], host))
+                    elif 'statement' in entry:
+                        self.statements.add(tuple(entry['statement']))
+                    else:
+                        getattr(self, entry['kind'])[entry['key']] = entry['id']
+            self._file = open(path, 'a')
+        else:
+            self._file = open(path, 'a')
+            self._write({'host': host})
+
+    def _write(self, entry):
+        with self._lock:
+            self._file.write(json.dumps(entry) + '\n')
+            self._file.flush()
+
+    def record(self, kind, key, value):
+        getattr(self, kind)[key] = value
+        self._write({'kind': kind, 'key': key, 'id': value})
+
+    def record_statement(self, statement):
+        self.statements.add(statement)
+        self._write({'statement': list(statement)})
+
+    def close(self):
+        self._file.close()
+
+
+class Uploader(object):
+
+    def __init__(self, host, classes, workers=8, retries=5, backoff_factor=0.5, journal=None):
+        # classes maps class URIs to (label, fixed id or None), journal is a path
+        self.api = host + '/api/'
+        self.api_resources = '{}resources/'.format(self.api)
+        self.api_predicates = '{}predicates/'.format(self.api)
+        self.api_literals = '{}literals/'.format(self.api)
+        self.api_statements = '{}statements/'.format(self.api)
+        self.api_classes = '{}classes/'.format(self.api)
+        self.classes = classes
+        self.workers = workers
+        self.ids = dict()
+        self._class_ids = dict()
+        self._predicate_ids = dict()
+        self._lock = threading.Lock()
+        self.journal = Journal(journal, host) if journal else None
+        if self.journal:
+            self._class_ids.update((URIRef(key), value) for key, value in self.journal.classes.items())
+            self._predicate_ids.update(self.journal.predicates)
+            self.ids.update(self.journal.nodes)
+
+        self.session = sessions.session(retries, backoff_factor, workers)
+        self.session.headers.update({'Content-Type': 'application/json', 'Accept': 'application/json'})
+
+    def store(self, g):
+        # Upload the statements of g, skipping labels and cube class memberships,
+        # which become resource labels and classes. Returns the ids of all nodes.
+        triples = [(s, p, o) for s, p, o in g
+                   if not (p == RDF.type and o in self.classes) and p != RDFS.label]
+
+        def label(term):
+            return g.value(term, RDFS.label)
+
+        def types(term):
+            return [o for o in g.objects(term, RDF.type) if o in self.classes]
+
+        def typed(term):
+            return next(g.objects(term, RDF.type), None) is not None
+
+        self.upload(triples, label, types, typed)
+        return self.ids
+
+    def stream(self, triples, chunk_size=10000):
+        # Upload statements from an iterator in chunks. rdfs:label and rdf:type
+        # statements of a node must come before the statements that use it, as
+        # datacube.triples() yields them. Returns the ids of all nodes.
+        labels = dict()
+        types = dict()
+        chunk = list()
+        for s, p, o in triples:
+            if p == RDFS.label:
+                labels[s] = o
+                continue
+            if p == RDF.type:
+                types.setdefault(s, []).append(o)
+                if o in self.classes:
+                    continue
+            chunk.append((s, p, o))
+            if len(chunk) >= chunk_size:
+                self._upload_chunk(chunk, labels, types)
+                chunk = list()
+        if chunk:
+            self._upload_chunk(chunk, labels, types)
+        return self.ids
+
+    def _upload_chunk(self, chunk, labels, types):
+        self.upload(chunk, labels.get, lambda term: [o for o in types.get(term, []) if o in self.classes],
+                    lambda term: term in types)
+        # Labels and types of resolved nodes are no longer needed, except those of
+        # properties (e.g. qb:DimensionProperty), which a later chunk may use as
+        # predicates
+        def resolved(term):
+            key = term.n3()
+            return key in self._predicate_ids or (key in self.ids and not _property(types.get(term, [])))
+        for term in [term for term in labels if resolved(term)]:
+            del labels[term]
+        for term in [term for term in types if resolved(term)]:
+            del types[term]
+
+    def upload(self, triples, label, types, typed):
+        predicates = list(dict.fromkeys(p for s, p, o in triples))
+        nodes = list(dict.fromkeys(term for s, p, o in triples for term in (s, o)))
+
+        self._map(self._class, {c for term in predicates + nodes if not isinstance(term, Literal) for c in types(term)})
+        self._map(lambda p: self._predicate(p, label, types, typed), predicates)
+        self._map(lambda node: self._node(node, label, types), nodes)
+        self._map(self._statement, triples)
+
+    def _map(self, function, items):
+        items = list(items)
+        if not items:
+            return
+        if self.workers > 1 and len(items) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(function, items))
+        else:
+            for item in items:
+                function(item)
+
+    def _request(self, method, url, **kwargs):
+        response = self.session.request(method, url, **kwargs)
+        response.raise_for_status()
+        return response
+
+    def _class(self, cls):
+        if cls in self._class_ids:
+            return self._class_ids[cls]
+        label, fixed_id = self.classes[cls]
+        if fixed_id is None:
+            found = self._request('GET', self.api_classes, params={'q': label, 'exact': 'true'}).json()
+            if len(found) == 0:
+                class_id = self._request('POST', self.api_classes, json={'label': label}).json()['id']
+            else:
+                class_id = found[0]['id']
+        else:
+            response = self.session.get(self.api_classes + fixed_id + '/')
+            if response.status_code == 404:
+                class_id = self._request('POST', self.api_classes, json={'label': label, 'id': fixed_id}).json()['id']
+            else:
+                response.raise_for_status()
+                class_id = response.json()['id']
+        with self._lock:
+            self._class_ids[cls] = class_id
+        if self.journal:
+            self.journal.record('classes', str(cls), class_id)
+        return class_id
+
+    def _predicate(self, p, label, types, typed):
+        if p.n3() in self._predicate_ids:
+            return self._predicate_ids[p.n3()]
+        l = label(p)
+        classes = [self._class_ids[c] for c in types(p)]
+        # Predicates that are typed resources are named with the id of their resource
+        if typed(p):
+            l = self._node(p, label, types)
+        if l is None:
+            raise Exception('Label is none for predicate {}'.format(p))
+        found = self._request('GET', self.api_predicates, params={'q': l, 'exact': 'true'}).json()
+        if len(found) == 0:
+            predicate_id = self._request('POST', self.api_predicates, json={'label': l, 'classes': classes}).json()['id']
+        else:
+            predicate_id = found[0]['id']
+        with self._lock:
+            self._predicate_ids[p.n3()] = predicate_id
+        if self.journal:
+            self.journal.record('predicates', p.n3(), predicate_id)
+        return predicate_id
+
+    def _node(self, node, label, types):
+        key = node.n3()
+        if key in self.ids:
+            return self.ids[key]
+        if isinstance(node, Literal):
+            node_id = self._request('POST', self.api_literals, json={'label': node, 'classes': []}).json()['id']
+        else:
+            l = label(node)
+            if l is None:
+                raise Exception('Label is none for resource {}'.format(node))
+            classes = [self._class_ids[c] for c in types(node)]
+            node_id = self._request('POST', self.api_resources, json={'label': l, 'classes': classes}).json()['id']
+        with self._lock:
+            self.ids[key] = node_id
+        if self.journal:
+            self.journal.record('nodes', key, node_id)
+        return node_id
+
+    def _statement(self, triple):
+        s, p, o = triple
+        statement = (self.ids[s.n3()], self._predicate_ids[p.n3()], self.ids[o.n3()])
+        if self.journal and statement in self.journal.statements:
+            return
+        self._request('POST', self.api_statements, json={'subject_id': statement[0],
+                                                          'predicate_id': statement[1],
+                                                          'object_id': statement[2]})
+        metrics.count('orkg_statements')
+        if self.journal:
+            self.journal.record_statement(statement)
+
+    def close(self):
+        if self.journal:
+            self.journal.close()
+
+
+def _property(types):
+    # Whether a term of types is a property, rdf:Property or one of its
+    # subclasses such as qb:MeasureProperty
+    return any(str(t).endswith('Property') for t in types)
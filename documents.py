@@ -0,0 +1,69 @@
+import os
+import json
+import requests
+from hashlib import md5, sha256
+from rdflib import Graph
+
+# Cache of the triples parsed from RDFa documents. pyRdfa runs once per distinct
+# document content; the result is kept as N-Triples under
+#   <cache_directory>/<md5 of source>-<sha256 of content>.nt
+# Remote documents are revalidated with If-None-Match / If-Modified-Since, so an
+# unchanged article costs one conditional request and no parsing. Local files
+# are identified by their content hash alone.
+cache_directory = os.path.join('.cache', 'rdfa')
+
+
+def triples(source, session=None):
+    # N-Triples (bytes) of the RDFa in a URL or local file
+    os.makedirs(cache_directory, exist_ok=True)
+    if os.path.exists(source):
+        with open(source, 'rb') as f:
+            content = f.read()
+        return _parsed(source, content, os.path.abspath(source))
+
+    key = md5(source.encode()).hexdigest()
+    meta_path = os.path.join(cache_directory, '{}.json'.format(key))
+    meta = dict()
+    if os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+
+    headers = dict()
+    if meta.get('hash') and os.path.exists(_path(source, meta['hash'])):
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+    response = (session or requests).get(source, headers=headers)
+    if response.status_code == 304:
+        with open(_path(source, meta['hash']), 'rb') as f:
+            return f.read()
+    response.raise_for_status()
+
+    nt = _parsed(source, response.content, source)
+    meta = {'hash': sha256(response.content).hexdigest(),
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified')}
+    with open(meta_path, 'w') as f:
+        json.dump(meta, f)
+    return nt
+
+
+def _path(source, content_hash):
+    return os.path.join(cache_directory, '{}-{}.nt'.format(md5(source.encode()).hexdigest(), content_hash))
+
+
+def _parsed(source, content, base):
+    path = _path(source, sha256(content).hexdigest())
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            return f.read()
+    graph = Graph()
+    graph.parse(data=content, format='rdfa', publicID=base)
+    nt = graph.serialize(format='nt')
+    nt = nt.encode() if isinstance(nt, str) else nt
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        f.write(nt)
+    os.replace(tmp, path)
+    return nt
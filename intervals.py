@@ -0,0 +1,47 @@
+from bisect import bisect_left, bisect_right
+
+# Interval index over events, kept next to the graph by utils.index(). Events
+# are grouped by (place, classification) and each group keeps its intervals
+# sorted by beginning, with timestamps as integer nanoseconds since the epoch
+# (UTC). The longest interval of a group bounds how far before a query window an
+# overlapping event can begin, so an overlap query is two binary searches plus
+# the matching events.
+
+
+class EventIndex(object):
+
+    def __init__(self):
+        self._groups = dict()
+
+    def __len__(self):
+        return sum(len(group['intervals']) for group in self._groups.values())
+
+    def keys(self):
+        return list(self._groups.keys())
+
+    def add(self, uri, place, classification, beginning, end):
+        group = self._groups.setdefault((place, classification), {'intervals': [], 'longest': 0})
+        interval = (beginning, end, uri)
+        intervals = group['intervals']
+        i = bisect_left(intervals, interval)
+        if i < len(intervals) and intervals[i] == interval:
+            return
+        intervals.insert(i, interval)
+        group['longest'] = max(group['longest'], end - beginning)
+
+    def overlapping(self, start, end, place=None, classification=None):
+        # (place, classification, beginning, end, uri) of the events that overlap
+        # [start, end], ordered by beginning
+        found = list()
+        for (group_place, group_classification), group in self._groups.items():
+            if place is not None and group_place != place:
+                continue
+            if classification is not None and group_classification != classification:
+                continue
+            intervals = group['intervals']
+            i = bisect_left(intervals, (start - group['longest'],))
+            j = bisect_right(intervals, (end, float('inf')))
+            found.extend((group_place, group_classification) + interval
+                         for interval in intervals[i:j] if interval[1] >= start)
+        found.sort(key=lambda item: item[2])
+        return found
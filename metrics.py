@@ -0,0 +1,238 @@
+import re
+import json
+import time
+import inspect
+import threading
+from collections import deque
+from functools import wraps
+
+# Opt-in instrumentation of the slow paths: stage timers, HTTP latency
+# histograms and byte counts per endpoint, triples added per stage, queries run
+# and the size of the graph over time, as the running count of triples added to
+# its store (counted from the store events, without the cost of len() on large
+# stores; re-assertions count, removals do not). Nothing is recorded until
+#   metrics.enable()
+# and while disabled every hook returns after checking `enabled`. The collected
+# metrics are exported with
+#   metrics.to_json(path)          summary as JSON
+#   metrics.to_prometheus(path)    Prometheus text exposition format
+enabled = False
+namespace = 'smear'
+# Upper bounds (seconds) of the HTTP latency histogram buckets
+buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Number of graph size samples kept
+history = 10000
+
+_lock = threading.Lock()
+_stages = dict()
+_http = dict()
+_counters = dict()
+_graph_sizes = deque(maxlen=history)
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _http.clear()
+        _counters.clear()
+        _graph_sizes.clear()
+
+
+def timed(stage, graph=None):
+    # Decorator recording the wall time of every call as `stage`. With graph, a
+    # function of the arguments of the call (by name, as bound to the signature)
+    # returning the running count of triples added to the store it writes to,
+    # the triples the call added and the count afterwards are recorded too.
+    def decorator(function):
+        signature = inspect.signature(function)
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            arguments = signature.bind(*args, **kwargs).arguments if graph else None
+            added = graph(arguments) if graph else None
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                _stage(stage, time.perf_counter() - start)
+                if graph:
+                    after = graph(arguments)
+                    count('triples_added', after - added, stage=stage)
+                    graph_size(after, stage)
+        return wrapper
+    return decorator
+
+
+class timer(object):
+    # Context manager recording the wall time of a block as `stage`
+    #   with metrics.timer('data.csv'):
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        if enabled:
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        if enabled:
+            _stage(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+def _stage(stage, seconds):
+    with _lock:
+        entry = _stages.setdefault(stage, {'count': 0, 'seconds': 0.0, 'max': 0.0})
+        entry['count'] += 1
+        entry['seconds'] += seconds
+        entry['max'] = max(entry['max'], seconds)
+
+
+def count(name, value=1, **labels):
+    if not enabled:
+        return
+    key = (name, tuple(sorted(labels.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def graph_size(size, stage=None):
+    if not enabled:
+        return
+    with _lock:
+        _graph_sizes.append((time.time(), stage, size))
+
+
+def instrument(session):
+    # Record the latency and the bytes of every response of a requests session
+    if _response not in session.hooks['response']:
+        session.hooks['response'].append(_response)
+    return session
+
+
+def _response(response, *args, **kwargs):
+    if not enabled:
+        return
+    request = response.request
+    key = (request.method, endpoint(response.url))
+    seconds = response.elapsed.total_seconds()
+    body = request.body or b''
+    with _lock:
+        entry = _http.get(key)
+        if entry is None:
+            entry = _http[key] = {'count': 0, 'seconds': 0.0, 'buckets': [0] * len(buckets), 'status': dict(),
+                                  'bytes_sent': 0, 'bytes_received': 0}
+        entry['count'] += 1
+        entry['seconds'] += seconds
+        for i, bound in enumerate(buckets):
+            if seconds <= bound:
+                entry['buckets'][i] += 1
+        status = str(response.status_code)
+        entry['status'][status] = entry['status'].get(status, 0) + 1
+        entry['bytes_sent'] += len(body)
+        entry['bytes_received'] += len(response.content or b'')
+
+
+def endpoint(url):
+    # URL without query, with path segments holding ids (digits) replaced by {id},
+    # so that e.g. every ORKG resource lookup counts as one endpoint
+    url = url.split('?', 1)[0]
+    scheme, _, rest = url.partition('://')
+    host, _, path = rest.partition('/')
+    path = '/'.join('{id}' if re.search(r'\d', segment) else segment for segment in path.split('/'))
+    return '{}://{}/{}'.format(scheme, host, path)
+
+
+def summary():
+    with _lock:
+        return {
+            'stages': {stage: dict(entry) for stage, entry in _stages.items()},
+            'http': [dict(method=method, endpoint=url, buckets=dict(zip([str(bound) for bound in buckets], entry['buckets'])),
+                          **{name: value for name, value in entry.items() if name != 'buckets'})
+                     for (method, url), entry in _http.items()],
+            'counters': [dict(name=name, value=value, labels=dict(labels)) for (name, labels), value in _counters.items()],
+            'graph_sizes': [{'time': t, 'stage': stage, 'size': size} for t, stage, size in _graph_sizes]
+        }
+
+
+def to_json(path=None):
+    text = json.dumps(summary(), indent=2)
+    if path:
+        with open(path, 'w') as f:
+            f.write(text)
+    return text
+
+
+def to_prometheus(path=None):
+    report = summary()
+    lines = []
+
+    def metric(name, kind, help_text):
+        lines.append('# HELP {}_{} {}'.format(namespace, name, help_text))
+        lines.append('# TYPE {}_{} {}'.format(namespace, name, kind))
+
+    def sample(name, value, **labels):
+        text = ','.join('{}="{}"'.format(label, _escape(labels[label])) for label in sorted(labels))
+        lines.append('{}_{}{} {}'.format(namespace, name, '{' + text + '}' if text else '', _number(value)))
+
+    metric('stage_seconds', 'summary', 'Wall time of instrumented stages.')
+    for stage, entry in sorted(report['stages'].items()):
+        sample('stage_seconds_sum', entry['seconds'], stage=stage)
+        sample('stage_seconds_count', entry['count'], stage=stage)
+
+    metric('http_request_duration_seconds', 'histogram', 'Latency of HTTP requests per endpoint.')
+    for entry in report['http']:
+        labels = dict(method=entry['method'], endpoint=entry['endpoint'])
+        for bound in buckets:
+            sample('http_request_duration_seconds_bucket', entry['buckets'][str(bound)], le=str(bound), **labels)
+        sample('http_request_duration_seconds_bucket', entry['count'], le='+Inf', **labels)
+        sample('http_request_duration_seconds_sum', entry['seconds'], **labels)
+        sample('http_request_duration_seconds_count', entry['count'], **labels)
+
+    metric('http_responses_total', 'counter', 'HTTP responses per endpoint and status.')
+    for entry in report['http']:
+        for status, value in sorted(entry['status'].items()):
+            sample('http_responses_total', value, method=entry['method'], endpoint=entry['endpoint'], status=status)
+
+    for name, help_text in (('bytes_sent', 'Request body bytes per endpoint.'),
+                            ('bytes_received', 'Response body bytes per endpoint.')):
+        metric('http_{}_total'.format(name), 'counter', help_text)
+        for entry in report['http']:
+            sample('http_{}_total'.format(name), entry[name], method=entry['method'], endpoint=entry['endpoint'])
+
+    for name in sorted({counter['name'] for counter in report['counters']}):
+        metric('{}_total'.format(name), 'counter', 'Number of {}.'.format(name.replace('_', ' ')))
+        for counter in report['counters']:
+            if counter['name'] == name:
+                sample('{}_total'.format(name), counter['value'], **counter['labels'])
+
+    if report['graph_sizes']:
+        metric('graph_triples', 'gauge', 'Triples added to the graph store up to the last write.')
+        sample('graph_triples', report['graph_sizes'][-1]['size'])
+
+    text = '\n'.join(lines) + '\n'
+    if path:
+        with open(path, 'w') as f:
+            f.write(text)
+    return text
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -0,0 +1,119 @@
+import os
+import numpy as np
+import pandas as pd
+from archive import Archive, Spectra
+
+# Pyramid of time-averaged spectra over a station archive, for views of long
+# time ranges:
+#   raw    the archive itself, every 10 minutes
+#   hour   hourly means
+#   day    daily means
+# Means are nan-aware: a cell is the mean of the values present in its interval
+# and nan only if there are none. Each level is kept next to the archive as
+#   <level>.f32  dense float32 (interval x size bin) array of means
+#   <level>.i8   datetime64[ns] start of every interval, sorted ascending
+# update() brings the levels up to date after days were appended to the
+# archive. Only the newest interval of a level and the rows after it are
+# reduced again, so adding a day costs a day, not the whole archive.
+#
+#   pyramid = Pyramid('Hyytiälä')
+#   pyramid.update('2019-01-01', '2019-12-31')
+#   level, times, spectra = pyramid.view('2015-01-01', '2020-01-01', pixels=1000)
+levels = [('raw', None), ('hour', 'h'), ('day', 'D')]
+steps = {'raw': pd.Timedelta('10min'), 'hour': pd.Timedelta('1h'), 'day': pd.Timedelta('1D')}
+# Archive rows reduced at a time when building a level
+chunk_size = 2 ** 20
+
+
+class Level(Spectra):
+
+    def __init__(self, directory, name, unit, bins):
+        Spectra.__init__(self, os.path.join(directory, '{}.f32'.format(name)),
+                         os.path.join(directory, '{}.i8'.format(name)), bins)
+        self.name = name
+        self.unit = unit
+
+
+class Pyramid(object):
+
+    def __init__(self, place=None, directory=None, archive=None):
+        self.archive = archive or Archive(place, directory)
+        self.place = self.archive.place
+        self.levels = {name: Level(self.archive.directory, name, unit, self.archive.bins)
+                       for name, unit in levels if unit}
+
+    def append(self, df):
+        # Append a data() or data_range() frame to the archive and update the levels
+        appended = self.archive.append(df)
+        self.build()
+        return appended
+
+    def update(self, start, end, **kwargs):
+        # Fetch the days from start to end into the archive and update the levels
+        appended = self.archive.update(start, end, **kwargs)
+        self.build()
+        return appended
+
+    def build(self):
+        # Reduce the archive rows from the start of the newest interval of every
+        # level on, replacing that interval and appending the ones after it
+        times, spectra = self.archive.times, self.archive.spectra
+        for level in self.levels.values():
+            n = len(level)
+            i = np.searchsorted(times, level.times[-1], side='left') if n else 0
+            n = max(n - 1, 0)
+            while i < len(times):
+                j = _boundary(times, i, i + chunk_size, level.unit)
+                interval_times, interval_spectra = means(times[i:j], spectra[i:j], level.unit)
+                level.write(n, interval_times, interval_spectra)
+                n, i = n + len(interval_times), j
+
+    def level(self, resolution=None, start=None, end=None, pixels=None):
+        # Name of the coarsest level whose step is at most resolution, or at most
+        # (end - start) / pixels. Without either, raw.
+        if resolution is None and pixels:
+            resolution = (pd.Timestamp(end) - pd.Timestamp(start)) / pixels
+        if resolution is None:
+            return 'raw'
+        resolution = pd.Timedelta(resolution)
+        name = 'raw'
+        for candidate, _ in levels:
+            if steps[candidate] <= resolution:
+                name = candidate
+        return name
+
+    def view(self, start, end, resolution=None, pixels=None):
+        # Level, interval start times and spectra in [start, end) at the coarsest
+        # level that satisfies resolution (or pixels columns across the range)
+        name = self.level(resolution, start, end, pixels)
+        source = self.archive if name == 'raw' else self.levels[name]
+        times, spectra = source.slice(start, end)
+        return name, times, spectra
+
+
+def means(times, spectra, unit):
+    # nan-aware means of the rows of spectra per interval of unit (numpy
+    # datetime unit, e.g. 'h' or 'D'). times must be sorted ascending.
+    if len(times) == 0:
+        return np.empty(0, dtype='datetime64[ns]'), np.empty((0, spectra.shape[1]), dtype=np.float32)
+    keys = np.asarray(times).astype('datetime64[{}]'.format(unit))
+    starts = np.flatnonzero(np.concatenate(([True], keys[1:] != keys[:-1])))
+    values = np.asarray(spectra, dtype=np.float64)
+    present = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(present, values, 0.0), starts, axis=0)
+    counts = np.add.reduceat(present.astype(np.int64), starts, axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        averages = np.where(counts > 0, sums / counts, np.nan)
+    return keys[starts].astype('datetime64[ns]'), averages.astype(np.float32)
+
+
+def _boundary(times, i, j, unit):
+    # End of the chunk of rows from i: the first row at or after j that starts an
+    # interval of unit, so that chunks never split an interval
+    if j >= len(times):
+        return len(times)
+    key = times[j].astype('datetime64[{}]'.format(unit))
+    end = np.searchsorted(times, key.astype('datetime64[ns]'), side='left')
+    if end <= i:
+        end = np.searchsorted(times, (key + 1).astype('datetime64[ns]'), side='left')
+    return int(end)
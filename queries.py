@@ -0,0 +1,164 @@
+import threading
+import numpy as np
+import pandas as pd
+
+# Registry of prepared SPARQL queries. Queries are registered by name as text and
+# compiled (parsed and translated to algebra) once, on first use, with the
+# namespaces below, so every call reuses the same plan. Parameters are initial
+# bindings of query variables, never formatted into the query text:
+#
+#   utils.query(queries.prepared('events'), bindings={'place': Literal('Hyytiälä', datatype=XSD.string)})
+#   g.query(queries.prepared('article'))
+#
+# events            events with place, beginning, end, classification and uri;
+#                   bind ?place (gn:name) or ?uri to select by place or event
+# events_in_window  events as above that overlap [?from, ?to] (xsd:dateTime);
+#                   an unbound ?from or ?to leaves the window open
+# article           title, doi, date and research field of bibo:Article
+# authors           first and last names of the creators of the article, in order
+namespaces = {
+    'rdf': 'http://www.w3.org/1999/02/22-rdf-syntax-ns#',
+    'rdfs': 'http://www.w3.org/2000/01/rdf-schema#',
+    'xsd': 'http://www.w3.org/2001/XMLSchema#',
+    'lode': 'http://linkedevents.org/ontology/',
+    'gn': 'http://www.geonames.org/ontology#',
+    'wgs84': 'http://www.w3.org/2003/01/geo/wgs84_pos#',
+    'smear': 'http://avaa.tdata.fi/web/smart/smear/',
+    'time': 'http://www.w3.org/2006/time#',
+    'bibo': 'http://purl.org/ontology/bibo/',
+    'dc': 'http://purl.org/dc/terms/',
+    'foaf': 'http://xmlns.com/foaf/0.1/',
+    'schema': 'http://schema.org/',
+    'orkg': 'http://orkg.org/core#'
+}
+
+_texts = dict()
+_prepared = dict()
+_lock = threading.Lock()
+
+
+def register(name, text):
+    # Add or replace the query of name; it is compiled on its next use
+    with _lock:
+        _texts[name] = text
+        _prepared.pop(name, None)
+
+
+def prepared(name):
+    # The compiled query of name
+    q = _prepared.get(name)
+    if q is None:
+        from rdflib.plugins.sparql import prepareQuery
+        with _lock:
+            q = _prepared.get(name)
+            if q is None:
+                if name not in _texts:
+                    raise LookupError('Query not found in registry [name = {}]'.format(name))
+                q = _prepared[name] = prepareQuery(_texts[name], initNs=namespaces)
+    return q
+
+
+def names():
+    return sorted(_texts)
+
+
+def frame(result, dtype={}):
+    # Build the result frame column by column from the result rows. Typed literals
+    # become native columns: xsd:dateTime as UTC datetimes, numeric datatypes as
+    # numbers and xsd:boolean as bool. Everything else is a string column.
+    names = [str(var) for var in result.vars]
+    rows = list(result)
+    columns = list(zip(*rows)) if rows else [()] * len(names)
+    df = pd.DataFrame({name: _column(terms) for name, terms in zip(names, columns)}, columns=names)
+    for column, column_dtype in dtype.items():
+        if column in df.columns and not (column_dtype in (str, 'str') and df[column].dtype == object):
+            df[column] = df[column].astype(column_dtype)
+    return df
+
+
+_numeric_datatypes = None
+_integer_datatypes = None
+
+
+def _datatypes():
+    global _numeric_datatypes, _integer_datatypes
+    if _numeric_datatypes is None:
+        from rdflib.namespace import XSD
+        _integer_datatypes = {XSD.integer, XSD.int, XSD.long, XSD.short, XSD.byte, XSD.nonNegativeInteger,
+                              XSD.positiveInteger, XSD.nonPositiveInteger, XSD.negativeInteger, XSD.unsignedInt,
+                              XSD.unsignedLong, XSD.unsignedShort, XSD.unsignedByte}
+        _numeric_datatypes = {XSD.double, XSD.float, XSD.decimal}
+    return _numeric_datatypes, _integer_datatypes
+
+
+def _column(terms):
+    from rdflib import Literal
+    from rdflib.namespace import XSD
+    numeric_datatypes, integer_datatypes = _datatypes()
+    values = [term for term in terms if term is not None]
+    datatypes = {term.datatype if isinstance(term, Literal) else False for term in values}
+    datatype = datatypes.pop() if len(datatypes) == 1 else None
+    complete = len(values) == len(terms)
+
+    if datatype == XSD.dateTime:
+        return pd.to_datetime([str(term) if term is not None else None for term in terms], utc=True)
+    if datatype in integer_datatypes and complete:
+        return np.array([int(term) for term in terms], dtype=np.int64)
+    if datatype in numeric_datatypes or datatype in integer_datatypes:
+        return np.array([float(term) if term is not None else np.nan for term in terms], dtype=np.float64)
+    if datatype == XSD.boolean and complete:
+        return np.array([term.toPython() for term in terms], dtype=bool)
+    return np.array([str(term) if term is not None else np.nan for term in terms], dtype=object)
+
+
+_events = """
+    ?uri rdf:type lode:Event .
+    ?uri lode:atTime ?atTime .
+    ?atTime time:hasBeginning ?hasBeginning .
+    ?hasBeginning time:inXSDDateTime ?beginning .
+    ?atTime time:hasEnd ?hasEnd .
+    ?hasEnd time:inXSDDateTime ?end .
+    ?uri lode:atPlace ?atPlace .
+    ?atPlace gn:name ?place .
+    ?atPlace wgs84:lat ?latitude .
+    ?atPlace wgs84:long ?longitude .
+    ?uri smear:hasClassification ?hasClassification .
+    ?hasClassification rdfs:label ?classification .
+"""
+
+register('events', """
+    SELECT ?place ?beginning ?end ?classification ?uri
+    WHERE {""" + _events + """}
+    ORDER BY ASC(?beginning)
+""")
+
+register('events_in_window', """
+    SELECT ?place ?beginning ?end ?classification ?uri
+    WHERE {""" + _events + """
+    FILTER ((!BOUND(?from) || ?end >= ?from) && (!BOUND(?to) || ?beginning <= ?to))
+    }
+    ORDER BY ASC(?beginning)
+""")
+
+register('article', """
+    SELECT ?title ?doi ?date ?researchField
+    WHERE {
+    ?a a bibo:Article .
+    OPTIONAL { ?a dc:title ?title . }
+    OPTIONAL { ?a bibo:doi ?doi . }
+    OPTIONAL { ?a dc:date ?date . }
+    OPTIONAL { ?a orkg:hasResearchField ?researchField . }
+    }
+""")
+
+register('authors', """
+    SELECT ?firstname ?lastname
+    WHERE {
+    ?a a bibo:Article .
+    ?a dc:creator ?c .
+    ?c foaf:givenname ?firstname .
+    ?c foaf:family_name ?lastname .
+    ?c schema:position ?position .
+    }
+    ORDER BY xsd:integer(?position)
+""")
@@ -0,0 +1,196 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime
+from dateutil import tz
+from hashlib import md5
+import metrics
+import utils
+
+# Formation rate J and growth rate GR of annotated events from the spectra of
+# data() or data_range(). Within size_range, for every event window:
+#   N   number concentration, the sum of dN/dlogDp over the bins times their
+#       width in log10(Dp), with bin diameters from the variable names
+#   GR  slope of the diameter of maximum concentration over time, nm/h
+#   J   dN/dt + GR / (upper - lower) * N, cm^-3 s^-1, i.e. the appearance
+#       rate of particles corrected for growth out of the range. The
+#       coagulation sink is not included.
+# Slopes are least squares fits over the window. All events of a batch are
+# computed at once on (event x time slot) arrays, and the per-time sums and
+# mode diameters are computed once for all events.
+#
+#   df = utils.data_range('2019-05-01', '2019-05-31')
+#   results = rates.rates(utils.events(), df)
+#   rates.record(results)
+size_range = (3.0, 25.0)
+# Events computed at once
+batch_size = 4096
+
+_terms = None
+
+
+def terms():
+    # SMEAR terms of the rates and their units, by label
+    global _terms
+    if _terms is None:
+        _terms = {label: utils.URIRef('{}{}'.format(utils.ns, name)) for label, name in (
+            ('formation rate', 'FormationRate'),
+            ('growth rate', 'GrowthRate'),
+            ('formation rate calculation', 'FormationRateCalculation'),
+            ('growth rate calculation', 'GrowthRateCalculation'),
+            ('per cubic centimetre per second', 'PerCubicCentimetrePerSecond'),
+            ('nanometre per hour', 'NanometrePerHour'))}
+    return _terms
+
+
+@metrics.timed('rates')
+def rates(events, df, place=None):
+    # J and GR of the events of place in an events() frame over a data() or
+    # data_range() frame of place
+    place = place or utils.place
+    times = df.index.values if df.index.dtype.kind == 'M' else utils._times(df).values
+    return rates_arrays(events, times, utils.spectrum(df, place), place)
+
+
+def rates_arrays(events, times, spectra, place=None):
+    # J and GR over a (time x size bin) array, e.g. from archive.Archive.slice().
+    # times are naive Helsinki times, as in data().
+    place = place or utils.place
+    columns = ['uri', 'place', 'beginning', 'end', 'concentration', 'formation_rate', 'growth_rate']
+    events = events[events.place == utils.configuration[place]['name']]
+    times = np.asarray(times, dtype='datetime64[ns]')
+    order = np.argsort(times, kind='stable')
+    times, spectra = times[order], np.asarray(spectra, dtype=np.float64)[order]
+
+    diameters = utils.diameters(place)
+    lower, upper = size_range
+    bins = np.flatnonzero((diameters >= lower) & (diameters < upper))
+    if len(bins) == 0:
+        raise LookupError('No size bin diameters in range [place = {}, range = {}]'.format(place, size_range))
+    widths = _log_widths(diameters)[bins]
+    values = spectra[:, bins]
+    present = ~np.isnan(values)
+    measured = present.any(axis=1)
+    concentration = np.where(present, values, 0.0).dot(widths)
+    concentration[~measured] = np.nan
+    mode = utils._modes(values, diameters[bins])
+
+    if len(events) == 0 or len(times) == 0:
+        return pd.DataFrame(columns=columns)
+    beginning = _naive(events.beginning)
+    end = _naive(events.end)
+    batches = [_window_rates(times, concentration, mode, beginning[i:i + batch_size], end[i:i + batch_size],
+                             upper - lower) for i in range(0, len(events), batch_size)]
+    mean, formation, growth = [np.concatenate(values) for values in zip(*batches)]
+
+    return pd.DataFrame({
+        'uri': events.uri.values,
+        'place': events.place.values,
+        'beginning': events.beginning.reset_index(drop=True),
+        'end': events.end.reset_index(drop=True),
+        'concentration': mean,
+        'formation_rate': formation,
+        'growth_rate': growth
+    }, columns=columns)
+
+
+def _window_rates(times, concentration, mode, beginning, end, width):
+    # Mean N, J and GR of the windows [beginning, end] as (event x slot) arrays
+    start = np.searchsorted(times, beginning, side='left')
+    stop = np.searchsorted(times, end, side='right')
+    length = np.maximum(stop - start, 0)
+    offsets = np.arange(max(length.max(), 1))
+    index = np.minimum(start[:, np.newaxis] + offsets, len(times) - 1)
+    inside = offsets[np.newaxis, :] < length[:, np.newaxis]
+    hours = (times[index] - beginning[:, np.newaxis]) / np.timedelta64(1, 'h')
+
+    n = concentration[index]
+    growth = utils._slopes(hours, mode[index], inside)
+    valid = inside & ~np.isnan(n)
+    with np.errstate(all='ignore'):
+        mean = np.where(valid, n, 0.0).sum(axis=1) / valid.sum(axis=1)
+        formation = (utils._slopes(hours, n, inside) + growth / width * mean) / 3600.0
+    return mean, formation, growth
+
+
+def _log_widths(diameters):
+    # Width of every size bin in log10(Dp), with edges halfway between the
+    # logarithms of neighbouring diameters; nan for bins without a diameter
+    widths = np.full(len(diameters), np.nan)
+    finite = np.flatnonzero(np.isfinite(diameters))
+    if len(finite) < 2:
+        return widths
+    logs = np.log10(diameters[finite])
+    middles = (logs[1:] + logs[:-1]) / 2
+    edges = np.concatenate(([2 * logs[0] - middles[0]], middles, [2 * logs[-1] - middles[-1]]))
+    widths[finite] = np.diff(edges)
+    return widths
+
+
+def _naive(column):
+    # Naive Helsinki datetime64 values of a column of events()
+    column = pd.to_datetime(column)
+    if column.dt.tz is not None:
+        column = column.dt.tz_convert('Europe/Helsinki').dt.tz_localize(None)
+    return column.values.astype('datetime64[ns]')
+
+
+@metrics.timed('rates.record', graph=utils._written)
+@utils._transaction
+def record(results, graph=None):
+    # Record the rates of a rates() frame in g (or graph) with the provenance of
+    # utils.duration(): per event and rate, a scalar measurement datum about the
+    # event, generated by a calculation that used the data set of the event.
+    # Nodes are content-addressed, so recording the same results again adds
+    # nothing. Returns the frame with the datum URIs, None for missing rates.
+    g = utils._target(graph)
+    obo, prov, RDF, XSD, URIRef, Literal = utils.obo, utils.prov, utils.RDF, utils.XSD, utils.URIRef, utils.Literal
+    vocabulary = terms()
+    datetime_now = Literal(datetime.utcnow().replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal()).isoformat(),
+                           datatype=XSD.dateTime)
+    utils._labels([obo['scalar measurement datum'], obo['has measurement unit label'], obo['has measurement value'],
+                   obo['is_specified_output_of'], obo['has_specified_output'], obo['has_specified_input']], g)
+    utils._labels(list(vocabulary.values()), g, vocabulary)
+
+    quads = []
+    datums = {'formation_rate': [], 'growth_rate': []}
+    for row in results.itertuples(index=False):
+        dataset_uri = None
+        for column, quantity, unit in (('formation_rate', 'formation rate', 'per cubic centimetre per second'),
+                                       ('growth_rate', 'growth rate', 'nanometre per hour')):
+            value = getattr(row, column)
+            if value is None or np.isnan(value):
+                datums[column].append(None)
+                continue
+            dataset_uri = dataset_uri or utils._dataset([row.uri], g)
+            calculation_key = '{}{}{}'.format(dataset_uri, column + '_calculation', value)
+            calculation_uri = URIRef('{}{}'.format(utils.ns, md5(calculation_key.encode()).hexdigest()))
+            datum_uri = URIRef('{}{}'.format(utils.ns, md5('{}{}'.format(calculation_key, 'datum').encode()).hexdigest()))
+            datums[column].append(datum_uri.toPython())
+            if (datum_uri, RDF.type, obo['scalar measurement datum']) in g:
+                continue
+
+            quads += [(triple[0], triple[1], triple[2], g) for triple in (
+                (calculation_uri, RDF.type, vocabulary[quantity + ' calculation']),
+                (datum_uri, RDF.type, obo['scalar measurement datum']),
+                (datum_uri, RDF.type, vocabulary[quantity]),
+                (datum_uri, RDF.type, utils.orkg['ResearchResult']),
+                (datum_uri, obo['is about'], URIRef(row.uri)),
+                (datum_uri, obo['has measurement value'], Literal(float(value), datatype=XSD.decimal)),
+                (datum_uri, obo['has measurement unit label'], vocabulary[unit]),
+                (datum_uri, obo['is_specified_output_of'], calculation_uri),
+                (calculation_uri, obo['has_specified_output'], datum_uri),
+                (calculation_uri, obo['has_specified_input'], dataset_uri),
+                (datum_uri, RDF.type, prov['Entity']),
+                (calculation_uri, RDF.type, prov['Activity']),
+                (datum_uri, prov['wasDerivedFrom'], dataset_uri),
+                (datum_uri, prov['wasGeneratedBy'], calculation_uri),
+                (calculation_uri, prov['used'], dataset_uri),
+                (calculation_uri, prov['startedAtTime'], datetime_now),
+                (calculation_uri, prov['endedAtTime'], datetime_now))]
+    g.addN(quads)
+    utils._commit(g)
+
+    results = results.copy()
+    results['formation_rate_datum'] = datums['formation_rate']
+    results['growth_rate_datum'] = datums['growth_rate']
+    return results
@@ -0,0 +1,92 @@
+import os
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+import utils
+
+# Headless rendering of size distribution plots. Figures are drawn with the Agg
+# canvas directly, without pyplot, so rendering works in worker processes and
+# on machines without a display.
+
+
+def figure(z, place=None, title=None):
+    # Figure of one (size bin x time) matrix, laid out like utils.plot()
+    fig = Figure(figsize=(10, 5), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    fig.colorbar(utils._draw(ax, z, place), ax=ax)
+    if title:
+        ax.set_title(title)
+    return fig
+
+
+def render(days, directory, place=None, workers=None):
+    # Write one PNG per day to directory, spreading days over a process pool.
+    # Returns the paths in the order of days.
+    place = place or utils.place
+    os.makedirs(directory, exist_ok=True)
+    settings = utils._settings()
+    with ProcessPoolExecutor(max_workers=workers, initializer=utils._initialize, initargs=(settings,)) as executor:
+        return list(executor.map(_render_day, days, [place] * len(days), [directory] * len(days)))
+
+
+def overview(days, path, place=None, columns=7):
+    # Tile the days into a single figure with a shared color scale
+    place = place or utils.place
+    matrices = [utils.spectrum(utils.data(day, place=place), place).T for day in days]
+    rows = int(np.ceil(len(days) / columns))
+    vmin = min(np.nanmin(z) for z in matrices if z.size)
+    vmax = max(np.nanmax(z) for z in matrices if z.size)
+
+    fig = Figure(figsize=(3 * columns, 2 * rows), dpi=100)
+    FigureCanvasAgg(fig)
+    axes = fig.subplots(rows, columns, squeeze=False, sharex=True, sharey=True)
+    mesh = None
+    for ax, day, z in zip(axes.flat, days, matrices):
+        mesh = utils._draw(ax, z, place)
+        mesh.set_clim(vmin, vmax)
+        x_ticks = np.arange(0, z.shape[1], 36)
+        ax.set_xticks(x_ticks)
+        ax.set_xticklabels(range(0, 6 * x_ticks.size, 6))
+        ax.set_title(day, fontsize='small')
+        ax.label_outer()
+    for ax in axes.flat[len(days):]:
+        ax.set_visible(False)
+    if mesh is not None:
+        fig.colorbar(mesh, ax=axes.ravel().tolist())
+    fig.savefig(path)
+    return path
+
+
+def timeline(start, end, path, place=None, pixels=1000, directory=None):
+    # Plot [start, end) of the station archive from its pyramid, at the coarsest
+    # level that still gives pixels columns across the range, so that months and
+    # years draw as fast as a day
+    from pyramid import Pyramid, steps
+    place = place or utils.place
+    level, times, spectra = Pyramid(place, directory).view(start, end, pixels=pixels)
+    if len(times) == 0:
+        raise LookupError('No archived spectra [place = {}, start = {}, end = {}]'.format(place, start, end))
+    z = np.asarray(spectra).T
+    n = z.shape[0]
+
+    fig = Figure(figsize=(10, 5), dpi=100)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(1, 1, 1)
+    mesh = ax.pcolormesh(np.append(times, times[-1] + steps[level].to_timedelta64()), np.arange(n + 1), z)
+    y_ticks = np.arange(0, n, 6)
+    ax.set_yticks(y_ticks + 0.5)
+    ax.set_yticklabels([utils._size_labels(place)[i] for i in y_ticks])
+    ax.set_ylabel('Diameter [nm]')
+    ax.set_title('{} ({})'.format(utils.configuration[place]['name'], level))
+    fig.autofmt_xdate()
+    fig.colorbar(mesh, ax=ax)
+    fig.savefig(path)
+    return path
+
+
+def _render_day(day, place, directory):
+    path = os.path.join(directory, '{}-{}.png'.format(utils.configuration[place]['smear_table'], day))
+    figure(utils.spectrum(utils.data(day, place=place), place).T, place, title=day).savefig(path)
+    return path
@@ -0,0 +1,25 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import metrics
+
+# Pooled HTTP sessions that retry failed requests with exponential backoff, for
+# the SMEAR requests of utils and the ORKG uploads of dev/upload.
+
+
+def session(retries, backoff_factor, pool_size):
+    # Session keeping up to pool_size connections per host and retrying requests
+    # of every method on connection errors and 429 and 5xx responses, recorded by
+    # metrics when enabled
+    retry_options = dict(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504))
+    try:
+        retry = Retry(allowed_methods=None, **retry_options)
+    except TypeError:
+        # urllib3 < 1.26
+        retry = Retry(method_whitelist=False, **retry_options)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    s = requests.Session()
+    s.mount('http://', adapter)
+    s.mount('https://', adapter)
+    metrics.instrument(s)
+    return s
@@ -0,0 +1,253 @@
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from rdflib import URIRef, BNode, Literal, Graph
+from rdflib.store import Store, VALID_STORE, NO_STORE
+
+# rdflib store persisted in a SQLite database. Terms are interned in a terms
+# table and statements are rows of term ids in a quads table with one index per
+# access pattern, so graphs are read on demand rather than loaded into memory.
+# Writes are collected in a transaction until commit().
+#
+#   store = SQLiteStore()
+#   store.open('events.sqlite', create=True)
+#   g = Graph(store, identifier=URIRef('http://example.org/graph'))
+
+# Terms kept in memory per store, least recently used first out
+cache_size = 100000
+
+_schema = """
+CREATE TABLE IF NOT EXISTS terms (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value TEXT NOT NULL,
+    datatype TEXT NOT NULL DEFAULT '',
+    language TEXT NOT NULL DEFAULT '',
+    UNIQUE (kind, value, datatype, language)
+);
+CREATE TABLE IF NOT EXISTS quads (
+    s INTEGER NOT NULL,
+    p INTEGER NOT NULL,
+    o INTEGER NOT NULL,
+    c INTEGER NOT NULL,
+    UNIQUE (s, p, o, c)
+);
+CREATE INDEX IF NOT EXISTS quads_pos ON quads (p, o, s);
+CREATE INDEX IF NOT EXISTS quads_osp ON quads (o, s, p);
+CREATE INDEX IF NOT EXISTS quads_c ON quads (c);
+CREATE TABLE IF NOT EXISTS namespaces (
+    prefix TEXT PRIMARY KEY,
+    uri TEXT NOT NULL UNIQUE
+);
+"""
+
+
+class SQLiteStore(Store):
+    context_aware = True
+    formula_aware = False
+    transaction_aware = True
+    graph_aware = True
+
+    def __init__(self, configuration=None, identifier=None):
+        self._connection = None
+        self._lock = threading.RLock()
+        # Least recently used terms and their ids, at most cache_size of them
+        self._ids = OrderedDict()
+        self._terms = dict()
+        super(SQLiteStore, self).__init__(configuration, identifier)
+
+    def open(self, configuration, create=True):
+        if not create and not os.path.exists(configuration):
+            return NO_STORE
+        self._connection = sqlite3.connect(configuration, check_same_thread=False)
+        self._connection.executescript(_schema)
+        self._connection.commit()
+        return VALID_STORE
+
+    def close(self, commit_pending_transaction=False):
+        if self._connection is not None:
+            if commit_pending_transaction:
+                self._connection.commit()
+            else:
+                self._connection.rollback()
+            self._connection.close()
+            self._connection = None
+
+    def commit(self):
+        with self._lock:
+            self._connection.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._connection.rollback()
+            # Ids of terms inserted in the rolled back transaction are no longer valid
+            self._ids.clear()
+            self._terms.clear()
+
+    # Terms
+
+    def _id(self, term, create=False):
+        if term in self._ids:
+            self._ids.move_to_end(term)
+            return self._ids[term]
+        if isinstance(term, Literal):
+            key = ('L', str(term), str(term.datatype or ''), term.language or '')
+        elif isinstance(term, BNode):
+            key = ('B', str(term), '', '')
+        else:
+            key = ('U', str(term), '', '')
+        row = self._connection.execute(
+            'SELECT id FROM terms WHERE kind = ? AND value = ? AND datatype = ? AND language = ?', key).fetchone()
+        if row is None:
+            if not create:
+                return None
+            row = (self._connection.execute(
+                'INSERT INTO terms (kind, value, datatype, language) VALUES (?, ?, ?, ?)', key).lastrowid,)
+        self._remember(term, row[0])
+        return row[0]
+
+    def _term(self, term_id):
+        if term_id in self._terms:
+            term = self._terms[term_id]
+            self._ids.move_to_end(term)
+            return term
+        kind, value, datatype, language = self._connection.execute(
+            'SELECT kind, value, datatype, language FROM terms WHERE id = ?', (term_id,)).fetchone()
+        if kind == 'L':
+            term = Literal(value, lang=language or None, datatype=URIRef(datatype) if datatype else None)
+        elif kind == 'B':
+            term = BNode(value)
+        else:
+            term = URIRef(value)
+        self._remember(term, term_id)
+        return term
+
+    def _remember(self, term, term_id):
+        self._ids[term] = term_id
+        self._terms[term_id] = term
+        while len(self._ids) > cache_size:
+            _, evicted = self._ids.popitem(last=False)
+            self._terms.pop(evicted, None)
+
+    @staticmethod
+    def _context_identifier(context):
+        return getattr(context, 'identifier', context)
+
+    def _graph(self, identifier):
+        return Graph(store=self, identifier=identifier)
+
+    # Statements
+
+    def add(self, triple, context, quoted=False):
+        Store.add(self, triple, context, quoted)
+        with self._lock:
+            ids = [self._id(term, create=True) for term in triple]
+            ids.append(self._id(self._context_identifier(context), create=True))
+            self._connection.execute('INSERT OR IGNORE INTO quads (s, p, o, c) VALUES (?, ?, ?, ?)', ids)
+
+    def addN(self, quads):
+        rows = list()
+        with self._lock:
+            for s, p, o, c in quads:
+                Store.add(self, (s, p, o), c, False)
+                rows.append((self._id(s, create=True), self._id(p, create=True), self._id(o, create=True),
+                             self._id(self._context_identifier(c), create=True)))
+            self._connection.executemany('INSERT OR IGNORE INTO quads (s, p, o, c) VALUES (?, ?, ?, ?)', rows)
+
+    def remove(self, triple_pattern, context=None):
+        with self._lock:
+            where, parameters = self._where(triple_pattern, context)
+            if where is None:
+                return
+            matches = self._connection.execute(
+                'SELECT rowid, s, p, o, c FROM quads' + where, parameters).fetchall()
+            for rowid, s, p, o, c in matches:
+                Store.remove(self, (self._term(s), self._term(p), self._term(o)), self._graph(self._term(c)))
+            self._connection.executemany('DELETE FROM quads WHERE rowid = ?', [(m[0],) for m in matches])
+
+    def _where(self, triple_pattern, context):
+        # WHERE clause for a pattern, or None if a bound term is not in the store
+        clauses = list()
+        parameters = list()
+        context = self._context_identifier(context)
+        for column, term in zip('spoc', tuple(triple_pattern) + (context,)):
+            if term is None:
+                continue
+            term_id = self._id(term)
+            if term_id is None:
+                return None, None
+            clauses.append('{} = ?'.format(column))
+            parameters.append(term_id)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), parameters
+
+    def triples(self, triple_pattern, context=None):
+        with self._lock:
+            where, parameters = self._where(triple_pattern, context)
+            if where is None:
+                return
+            if self._context_identifier(context) is None:
+                rows = self._connection.execute('SELECT DISTINCT s, p, o FROM quads' + where, parameters).fetchall()
+            else:
+                rows = self._connection.execute('SELECT s, p, o FROM quads' + where, parameters).fetchall()
+            triples = [(self._term(s), self._term(p), self._term(o)) for s, p, o in rows]
+        for triple in triples:
+            if context is not None:
+                yield triple, iter([context])
+            else:
+                yield triple, self.contexts(triple)
+
+    def __len__(self, context=None):
+        with self._lock:
+            context = self._context_identifier(context)
+            if context is None:
+                return self._connection.execute('SELECT COUNT(*) FROM (SELECT DISTINCT s, p, o FROM quads)').fetchone()[0]
+            context_id = self._id(context)
+            if context_id is None:
+                return 0
+            return self._connection.execute('SELECT COUNT(*) FROM quads WHERE c = ?', (context_id,)).fetchone()[0]
+
+    def contexts(self, triple=None):
+        with self._lock:
+            if triple is None:
+                rows = self._connection.execute('SELECT DISTINCT c FROM quads').fetchall()
+            else:
+                where, parameters = self._where(triple, None)
+                rows = [] if where is None else \
+                    self._connection.execute('SELECT DISTINCT c FROM quads' + where, parameters).fetchall()
+            identifiers = [self._term(c) for c, in rows]
+        for identifier in identifiers:
+            yield self._graph(identifier)
+
+    def add_graph(self, graph):
+        with self._lock:
+            self._id(graph.identifier, create=True)
+
+    def remove_graph(self, graph):
+        self.remove((None, None, None), graph)
+
+    # Namespaces
+
+    def bind(self, prefix, namespace, override=True, replace=False):
+        with self._lock:
+            bound = self._connection.execute('SELECT uri FROM namespaces WHERE prefix = ?', (prefix,)).fetchone()
+            if bound is not None and not (override or replace):
+                return
+            self._connection.execute('DELETE FROM namespaces WHERE prefix = ? OR uri = ?', (prefix, str(namespace)))
+            self._connection.execute('INSERT INTO namespaces (prefix, uri) VALUES (?, ?)', (prefix, str(namespace)))
+
+    def namespace(self, prefix):
+        with self._lock:
+            row = self._connection.execute('SELECT uri FROM namespaces WHERE prefix = ?', (prefix,)).fetchone()
+        return URIRef(row[0]) if row else None
+
+    def prefix(self, namespace):
+        with self._lock:
+            row = self._connection.execute('SELECT prefix FROM namespaces WHERE uri = ?', (str(namespace),)).fetchone()
+        return row[0] if row else None
+
+    def namespaces(self):
+        with self._lock:
+            rows = self._connection.execute('SELECT prefix, uri FROM namespaces').fetchall()
+        for prefix, uri in rows:
+            yield prefix, URIRef(uri)
@@ -0,0 +1,111 @@
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from rdflib import Dataset, Graph, URIRef
+import utils
+
+# Station sessions. A Station is bound to one place of utils.configuration and
+# annotates into its own graph, named after the station, instead of the module
+# place and g. Sessions share no state, so stations can be fetched, annotated
+# and summarized in parallel and their graphs merged into one dataset:
+#
+#   def annotate(station):
+#       ...station.data(day)... station.event(day, '10:00', '12:00', 'Class Ia')
+#       return station.events()
+#
+#   dataset, results = run(['Hyytiälä', 'Puijo', 'Värriö'], annotate)
+#   dataset.graph(graph_identifier('Puijo'))
+#
+# With processes=True each station runs in its own process, which is what
+# CPU-bound annotation needs; function must then be a module-level function.
+# The workers get the SMEAR settings of utils (smear_url, cache_directory,
+# cache_size, offline) of the calling process.
+
+
+def graph_identifier(place):
+    return URIRef('{}graph/{}'.format(utils.ns, utils.configuration[place]['encoded_name']))
+
+
+def dataset():
+    # Empty dataset with the namespace bindings of utils
+    ds = Dataset()
+    utils._bind(ds)
+    return ds
+
+
+class Station(object):
+
+    def __init__(self, place, graph=None):
+        if place not in utils.configuration or 'smear_table' not in utils.configuration[place]:
+            raise LookupError('Place not found in configuration [place = {}]'.format(place))
+        self.place = place
+        if graph is None:
+            graph = Graph(identifier=graph_identifier(place))
+            utils._bind(graph)
+        self.graph = graph
+
+    def data(self, date):
+        return utils.data(date, place=self.place)
+
+    def data_range(self, start, end, workers=4, window=7):
+        return utils.data_range(start, end, place=self.place, workers=workers, window=window)
+
+    def spectrum(self, df):
+        return utils.spectrum(df, place=self.place)
+
+    def plot(self, df):
+        utils.plot(df, place=self.place)
+
+    def event(self, day, beginning, end, classification):
+        utils.event(day, beginning, end, classification, place=self.place, graph=self.graph)
+
+    def add_events(self, df, batch_size=10000):
+        utils.add_events(df, batch_size, place=self.place, graph=self.graph)
+
+    def events(self, start=None, end=None):
+        return utils.events(graph=self.graph, start=start, end=end)
+
+    def overlapping(self, start, end, classification=None):
+        return utils.overlapping(start, end, classification=classification, graph=self.graph)
+
+    def duration(self, value, df):
+        return utils.duration(value, df, graph=self.graph)
+
+    def query(self, q, dtype={}):
+        return utils.query(q, dtype, graph=self.graph)
+
+
+def merge(target, graph):
+    # Add the triples of a station graph to the named graph of the same identifier in target
+    named = target.graph(graph.identifier)
+    target.addN((s, p, o, named) for s, p, o in graph)
+    return named
+
+
+def run(places, function, workers=None, processes=False, target=None):
+    # Call function(Station(place)) for every place in parallel threads, or
+    # processes, and merge the station graphs into target (a new dataset by
+    # default). Returns the dataset and the results of function by place.
+    target = target if target is not None else dataset()
+    workers = workers or len(places)
+    results = dict()
+    if processes:
+        with ProcessPoolExecutor(max_workers=workers, initializer=utils._initialize,
+                                 initargs=(utils._settings(),)) as executor:
+            for place, (result, nt) in zip(places, executor.map(_run, places, [function] * len(places))):
+                graph = Graph(identifier=graph_identifier(place))
+                graph.parse(data=nt, format='nt')
+                merge(target, graph)
+                results[place] = result
+    else:
+        stations = [Station(place) for place in places]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for station, result in zip(stations, executor.map(function, stations)):
+                merge(target, station.graph)
+                results[station.place] = result
+    return target, results
+
+
+def _run(place, function):
+    station = Station(place)
+    result = function(station)
+    nt = station.graph.serialize(format='nt')
+    return result, nt.decode() if isinstance(nt, bytes) else nt
@@ -0,0 +1,183 @@
+import warnings
+import numpy as np
+import pandas as pd
+import utils
+
+# Monthly, seasonal and overall statistics of events() in the layout of
+# dev/Monthly.csv and dev/Summary.csv. Every event contributes its start time,
+# end time and duration, plus sunrise and sunset at its station on its day,
+# computed from the station's latitude and longitude with the NOAA solar
+# equations. Clock times are minutes after local midnight in Helsinki time,
+# shown modulo 24 hours (a sunset after midnight is 00:40, not 24:40).
+#
+#   statistics = EventStatistics()
+#   statistics.update(utils.events())
+#   save_dataset(statistics.monthly(), 'Monthly overview', dimensions=['Month', 'Statistics'])
+#   save_dataset(statistics.summary(), 'Summary', dimensions=['Statistics'])
+#
+# Min, Max, Mean and Median are taken over the events of a month, a season or,
+# in summary(), all events. Without place the tables pool the events of all
+# stations; monthly(place), seasonal(place) and summary(place) are those of one
+# station, given as configuration key or station name.
+#
+# update() only adds events it has not seen before: their sums, counts, minima
+# and maxima per group are aggregated at once with groupby and merged into the
+# running ones, and their values are kept per group for the medians.
+
+measures = ['Event start time', 'Event end time', 'Duration', 'Sunrise', 'Sunset']
+seasons = {12: 'DJF', 1: 'DJF', 2: 'DJF', 3: 'MAM', 4: 'MAM', 5: 'MAM',
+           6: 'JJA', 7: 'JJA', 8: 'JJA', 9: 'SON', 10: 'SON', 11: 'SON'}
+statistics = ['Min', 'Max', 'Mean', 'Median']
+# Group keys are (kind, value, station): kind month, season or all, and station
+# '' for all stations pooled
+_keys = ['kind', 'value', 'station']
+
+
+class EventStatistics(object):
+
+    def __init__(self):
+        self._uris = set()
+        # (measure, sum | count | min | max) columns indexed by group key
+        self._aggregates = None
+        # Per group key, arrays of (event x measure) values
+        self._values = dict()
+
+    def __len__(self):
+        return len(self._uris)
+
+    def update(self, df):
+        # Add the events of an events() frame that have not been added before
+        df = df[~df.uri.isin(self._uris)].drop_duplicates('uri')
+        if len(df) == 0:
+            return 0
+        values = pd.DataFrame(_measures(df), columns=measures)
+        months = df.beginning.dt.tz_convert('Europe/Helsinki').dt.month.values
+        groups = []
+        for kind, labels in (('month', months), ('season', [seasons[month] for month in months]),
+                             ('all', '')):
+            for station in ('', df.place.values):
+                groups.append(values.assign(kind=kind, value=labels, station=station))
+        grouped = pd.concat(groups, ignore_index=True).groupby(_keys, sort=False)[measures]
+
+        aggregates = grouped.agg(['sum', 'count', 'min', 'max'])
+        if self._aggregates is not None:
+            aggregates = pd.concat([self._aggregates, aggregates])
+            aggregates = aggregates.groupby(level=_keys, sort=False).agg(
+                {column: 'sum' if column[1] in ('sum', 'count') else column[1] for column in aggregates.columns})
+        self._aggregates = aggregates
+        for key, group in grouped:
+            self._values.setdefault(key, []).append(group.values)
+        self._uris.update(df.uri)
+        return len(df)
+
+    def _statistics(self, key):
+        # Min, Max, Mean and Median of every measure over the events of a group,
+        # as rows of minutes
+        aggregate = self._aggregates.loc[key]
+        values = np.concatenate(self._values[key])
+        with warnings.catch_warnings(), np.errstate(invalid='ignore', divide='ignore'):
+            # All-nan measures (e.g. sunrise during polar day) stay nan
+            warnings.simplefilter('ignore', RuntimeWarning)
+            medians = np.nanmedian(values, axis=0)
+        rows = {'Min': [aggregate[(column, 'min')] for column in measures],
+                'Max': [aggregate[(column, 'max')] for column in measures],
+                'Mean': [aggregate[(column, 'sum')] / aggregate[(column, 'count')]
+                         if aggregate[(column, 'count')] else np.nan for column in measures],
+                'Median': list(medians)}
+        return [rows[statistic] for statistic in statistics]
+
+    def _labels(self, kind, station):
+        if self._aggregates is None:
+            return []
+        return [value for k, value, s in self._aggregates.index if k == kind and s == station]
+
+    def monthly(self, place=None):
+        station = _station(place)
+        months = sorted(self._labels('month', station))
+        return self._table('Month', months, [('month', month, station) for month in months])
+
+    def seasonal(self, place=None):
+        station = _station(place)
+        present = [season for season in ['DJF', 'MAM', 'JJA', 'SON'] if season in self._labels('season', station)]
+        return self._table('Season', present, [('season', season, station) for season in present])
+
+    def summary(self, place=None):
+        # Min, Max, Mean and Median over all events, as in dev/Summary.csv
+        station = _station(place)
+        if not self._labels('all', station):
+            return pd.DataFrame(columns=['Statistics'] + measures)
+        df = self._frame(self._statistics(('all', '', station)))
+        df.insert(0, 'Statistics', statistics)
+        return df
+
+    def _table(self, dimension, labels, keys):
+        # One row per group and statistic
+        rows = [row for key in keys for row in self._statistics(key)]
+        df = self._frame(rows)
+        df.insert(0, 'Statistics', statistics * len(keys))
+        df.insert(0, dimension, [label for label in labels for _ in statistics])
+        return df
+
+    def _frame(self, rows):
+        return pd.DataFrame([[_clock(value, column != 'Duration') for column, value in zip(measures, row)]
+                             for row in rows], columns=measures)
+
+
+def _station(place):
+    # Station name of a configuration key or name, '' for all stations
+    if place is None:
+        return ''
+    return utils.configuration[place]['name'] if place in utils.configuration else place
+
+
+def sun(dates, latitude, longitude):
+    # Sunrise and sunset in minutes after local midnight (Helsinki) for arrays of
+    # dates and coordinates in degrees. nan during polar day and polar night.
+    dates = pd.DatetimeIndex(dates).normalize()
+    latitude = np.radians(np.asarray(latitude, dtype=float))
+    longitude = np.asarray(longitude, dtype=float)
+    gamma = 2 * np.pi / 365 * (dates.dayofyear.values - 1)
+    equation_of_time = 229.18 * (0.000075 + 0.001868 * np.cos(gamma) - 0.032077 * np.sin(gamma)
+                                 - 0.014615 * np.cos(2 * gamma) - 0.040849 * np.sin(2 * gamma))
+    declination = (0.006918 - 0.399912 * np.cos(gamma) + 0.070257 * np.sin(gamma)
+                   - 0.006758 * np.cos(2 * gamma) + 0.000907 * np.sin(2 * gamma)
+                   - 0.002697 * np.cos(3 * gamma) + 0.00148 * np.sin(3 * gamma))
+    with np.errstate(invalid='ignore'):
+        hour_angle = np.degrees(np.arccos(np.cos(np.radians(90.833)) / (np.cos(latitude) * np.cos(declination))
+                                          - np.tan(latitude) * np.tan(declination)))
+    sunrise = 720 - 4 * (longitude + hour_angle) - equation_of_time
+    sunset = 720 - 4 * (longitude - hour_angle) - equation_of_time
+
+    # UTC offset of Helsinki in minutes on each date
+    local = dates.tz_localize('UTC').tz_convert('Europe/Helsinki').tz_localize(None)
+    offset = (local - dates).total_seconds().values / 60
+    return sunrise + offset, sunset + offset
+
+
+def _measures(df):
+    stations = {utils.configuration[key]['name']: key for key in utils.configuration
+                if 'latitude' in utils.configuration[key]}
+    keys = df.place.map(stations)
+    latitude = keys.map(lambda key: float(utils.configuration[key]['latitude'])).values
+    longitude = keys.map(lambda key: float(utils.configuration[key]['longitude'])).values
+    beginning = df.beginning.dt.tz_convert('Europe/Helsinki')
+    end = df.end.dt.tz_convert('Europe/Helsinki')
+    midnight = beginning.dt.normalize()
+    sunrise, sunset = sun(beginning.dt.tz_localize(None).values, latitude, longitude)
+    return {
+        'Event start time': ((beginning - midnight).dt.total_seconds() / 60).values,
+        'Event end time': ((end - midnight).dt.total_seconds() / 60).values,
+        'Duration': ((end - beginning).dt.total_seconds() / 60).values,
+        'Sunrise': sunrise,
+        'Sunset': sunset
+    }
+
+
+def _clock(minutes, wrap=True):
+    # hh:mm of minutes; clock times (wrap) are taken modulo 24 hours
+    if np.isnan(minutes):
+        return ''
+    minutes = int(round(minutes))
+    if wrap:
+        minutes %= 24 * 60
+    return '{:02d}:{:02d}'.format(minutes // 60, minutes % 60)
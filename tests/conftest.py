@@ -0,0 +1,46 @@
+import os
+import sys
+import pytest
+
+# Modules of the repository root come first; dev/ has a utils module of its own,
+# so it is appended after the root and its modules other than utils are
+# imported by name (upload, datacube).
+root = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+for path in (root, os.path.join(root, 'benchmarks'), os.path.join(root, 'dev')):
+    if path not in sys.path:
+        sys.path.append(path)
+sys.path.remove(root)
+sys.path.insert(0, root)
+
+
+@pytest.fixture
+def orkg():
+    from mock_orkg import MockORKG
+    server = MockORKG().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def smear(monkeypatch, tmp_path):
+    # Mock SMEAR service for utils, with an empty download cache and a new session
+    import utils
+    from mock_smear import MockSMEAR
+    server = MockSMEAR().start()
+    monkeypatch.setattr(utils, 'smear_url', server.url)
+    monkeypatch.setattr(utils, 'cache_directory', str(tmp_path / 'smear'))
+    monkeypatch.setattr(utils, 'backoff_factor', 0)
+    monkeypatch.setattr(utils, '_session_instance', None)
+    yield server
+    server.stop()
+    utils._session_instance = None
+
+
+@pytest.fixture
+def sqlite_graph(tmp_path):
+    # Graph in a SQLite store in a new database file
+    from rdflib import Graph, URIRef
+    from sqlitestore import SQLiteStore
+    store = SQLiteStore(str(tmp_path / 'graph.sqlite'))
+    yield Graph(store, identifier=URIRef('http://example.org/graph'))
+    store.close()
@@ -0,0 +1,88 @@
+import io
+import pytest
+from rdflib import Graph, URIRef
+import changes
+import utils
+
+
+def export(since, graph, format='nt'):
+    added, removed = io.StringIO(), io.StringIO()
+    until = changes.export(since, added, removed, format=format, graph=graph)
+    return until, added.getvalue().splitlines(), removed.getvalue().splitlines()
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def graph(request):
+    if request.param == 'memory':
+        return Graph(identifier=URIRef('http://example.org/graph'))
+    return request.getfixturevalue('sqlite_graph')
+
+
+def test_export_lists_only_new_triples(graph):
+    utils.event('2019-05-01', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=graph)
+    since = changes.track(graph)
+    size = len(graph)
+    utils.event('2019-05-02', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=graph)
+    since, added, removed = export(since, graph)
+    # Triples about the place and classification are re-asserted, not new
+    assert len(added) == len(graph) - size == 12
+    assert removed == []
+
+    utils.event('2019-05-02', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=graph)
+    assert export(since, graph)[1:] == ([], [])
+
+
+def test_export_nets_removals(graph):
+    since = changes.track(graph)
+    utils.event('2019-05-01', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=graph)
+    checkpoint = changes.checkpoint(graph)
+    uri = URIRef(utils.events(graph).uri[0])
+    assert changes.remove((uri, None, None), graph) == 5
+    assert len(utils.overlapping('2019-05-01', '2019-05-02', graph=graph)) == 0
+
+    _, added, removed = export(checkpoint, graph)
+    assert added == [] and len(removed) == 5
+    # Since the first checkpoint the triples about the event were added and then
+    # removed; they count by their last change
+    _, added, removed = export(since, graph, format='nquads')
+    assert len(added) == 20 and len(removed) == 5
+    assert all(line.endswith('<http://example.org/graph> .') for line in added)
+
+
+def test_rollback_drops_uncommitted_changes(sqlite_graph, monkeypatch):
+    def fail(graph=None):
+        raise RuntimeError('commit failed')
+    since = changes.track(sqlite_graph)
+    monkeypatch.setattr(utils, '_commit', fail)
+    with pytest.raises(RuntimeError):
+        utils.event('2019-05-01', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=sqlite_graph)
+    monkeypatch.undo()
+    assert export(since, sqlite_graph)[1:] == ([], [])
+
+
+def test_compacted_checkpoints_are_gone(graph):
+    since = changes.track(graph)
+    utils.event('2019-05-01', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=graph)
+    checkpoint = changes.checkpoint(graph)
+    utils.event('2019-05-02', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=graph)
+    changes.compact(checkpoint, graph)
+    with pytest.raises(LookupError):
+        export(since, graph)
+    assert len(export(checkpoint, graph)[1]) == 12
+
+
+def test_untracked_graph_cannot_export():
+    with pytest.raises(LookupError):
+        export(0, Graph())
+
+
+def test_saved_events_load_as_events(tmp_path):
+    g = Graph()
+    utils.event('2019-05-01', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=g)
+    utils.event('2019-05-02', '09:00', '13:00', 'Class II', place='Värriö', graph=g)
+    path = str(tmp_path / 'events.npz')
+    assert changes.save_events(path, g) == 2
+    loaded = changes.load_events(path)
+    expected = utils.events(g)
+    assert list(loaded.columns) == list(expected.columns)
+    assert (loaded.beginning == expected.beginning).all() and (loaded.uri == expected.uri).all()
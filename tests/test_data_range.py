@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+import pytest
+import utils
+
+
+def test_range_is_one_time_indexed_frame(smear):
+    df = utils.data_range('2019-05-01', '2019-05-10', 'Hyytiälä', workers=4, window=3)
+    assert len(df) == 10 * 144
+    assert df.index.is_monotonic_increasing and df.index.is_unique
+    assert df.index[0] == pd.Timestamp('2019-05-01 00:00') and df.index[-1] == pd.Timestamp('2019-05-10 23:50')
+    # Windows of 3 consecutive days: 1-3, 4-6, 7-9 and 10
+    assert sum(smear.requests.values()) == 4
+
+
+def test_range_matches_single_days(smear):
+    df = utils.data_range('2019-05-01', '2019-05-02', 'Hyytiälä', window=2)
+    day = utils.data('2019-05-02', place='Hyytiälä')
+    np.testing.assert_array_equal(utils.spectrum(df, 'Hyytiälä')[144:], utils.spectrum(day, 'Hyytiälä'))
+
+
+def test_cached_days_are_not_requested_again(smear, monkeypatch):
+    utils.data_range('2019-05-01', '2019-05-03', 'Hyytiälä')
+    smear.reset()
+    df = utils.data_range('2019-04-30', '2019-05-03', 'Hyytiälä')
+    assert len(df) == 4 * 144
+    assert sum(smear.requests.values()) == 1
+
+    monkeypatch.setattr(utils, 'offline', True)
+    assert len(utils.data_range('2019-05-01', '2019-05-03', 'Hyytiälä')) == 3 * 144
+    with pytest.raises(LookupError):
+        utils.data_range('2019-05-01', '2019-05-05', 'Hyytiälä')
+
+
+def test_failed_requests_are_retried(smear):
+    smear.failure_rate = 0.5
+    df = utils.data_range('2019-05-01', '2019-05-08', 'Hyytiälä', workers=2, window=1)
+    assert len(df) == 8 * 144
+    assert smear.failures > 0
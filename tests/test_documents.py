@@ -0,0 +1,91 @@
+import os
+import json
+import threading
+import pytest
+from hashlib import md5, sha256
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from rdflib import Graph
+import documents
+import utils
+
+article = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'article.html')
+
+
+def _rdfa():
+    from rdflib import plugin
+    from rdflib.parser import Parser
+    try:
+        plugin.get('rdfa', Parser)
+        return True
+    except plugin.PluginException:
+        return False
+
+
+# rdflib 6 and later ship without the RDFa parser
+rdfa = pytest.mark.skipif(not _rdfa(), reason='rdflib without the RDFa parser')
+
+
+@pytest.fixture(autouse=True)
+def cache(monkeypatch, tmp_path):
+    monkeypatch.setattr(documents, 'cache_directory', str(tmp_path / 'rdfa'))
+    return tmp_path / 'rdfa'
+
+
+@pytest.fixture
+def server():
+    # Serves one document with an ETag and answers If-None-Match with 304
+    state = {'etag': '"1"', 'body': b'<html></html>', 'conditional': []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            state['conditional'].append(self.headers.get('If-None-Match'))
+            if self.headers.get('If-None-Match') == state['etag']:
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('ETag', state['etag'])
+            self.send_header('Content-Length', str(len(state['body'])))
+            self.end_headers()
+            self.wfile.write(state['body'])
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    state['url'] = 'http://127.0.0.1:{}/article.html'.format(httpd.server_address[1])
+    yield state
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_unchanged_remote_document_is_revalidated(server, cache):
+    # A cached document costs one conditional request and is not parsed again
+    nt = b'<http://example.org/a> <http://example.org/b> "c" .\n'
+    content_hash = sha256(server['body']).hexdigest()
+    os.makedirs(str(cache))
+    with open(documents._path(server['url'], content_hash), 'wb') as f:
+        f.write(nt)
+    with open(os.path.join(str(cache), '{}.json'.format(md5(server['url'].encode()).hexdigest())), 'w') as f:
+        json.dump({'hash': content_hash, 'etag': server['etag'], 'last_modified': None}, f)
+
+    assert documents.triples(server['url']) == nt
+    assert server['conditional'] == [server['etag']]
+
+
+@rdfa
+def test_local_file_is_parsed_once(cache, monkeypatch):
+    first = documents.triples(article)
+    monkeypatch.setattr(Graph, 'parse', lambda *args, **kwargs: pytest.fail('parsed again'))
+    assert documents.triples(article) == first
+    assert len(os.listdir(str(cache))) == 1
+
+
+@rdfa
+def test_parse_many_merges_into_graph():
+    expected = Graph()
+    expected.parse(data=documents.triples(article), format='nt')
+    g = Graph()
+    utils.parse_many([article, article], workers=2, graph=g)
+    assert len(g) == len(expected) > 0
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+from rdflib import Graph
+from intervals import EventIndex
+import utils
+
+
+def test_overlapping_matches_brute_force():
+    rng = np.random.RandomState(0)
+    beginnings = rng.randint(0, 10000, 500)
+    ends = beginnings + rng.randint(0, 300, 500)
+    places = rng.choice(['A', 'B'], 500)
+    ix = EventIndex()
+    for i, (beginning, end, place) in enumerate(zip(beginnings, ends, places)):
+        ix.add('e{}'.format(i), place, 'Class Ia', int(beginning), int(end))
+    ix.add('e0', places[0], 'Class Ia', int(beginnings[0]), int(ends[0]))
+    assert len(ix) == 500
+
+    for start, end in rng.randint(0, 10000, (50, 2)):
+        start, end = sorted((int(start), int(end)))
+        for place in (None, 'A'):
+            expected = {'e{}'.format(i) for i in range(500)
+                        if ends[i] >= start and beginnings[i] <= end and place in (None, places[i])}
+            found = ix.overlapping(start, end, place=place)
+            assert {uri for _, _, _, _, uri in found} == expected
+            assert [item[2] for item in found] == sorted(item[2] for item in found)
+
+
+def test_index_follows_graph_writes():
+    g = Graph()
+    utils.event('2019-05-01', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=g)
+    assert len(utils.overlapping('2019-05-01 11:00', '2019-05-01 13:00', graph=g)) == 1
+    utils.add_events(pd.DataFrame({'day': ['2019-05-01', '2019-05-02'], 'beginning': ['11:30', '10:00'],
+                                   'end': ['14:00', '12:00'], 'classification': ['Class Ib', 'Class Ia'],
+                                   'place': ['Puijo', 'Hyytiälä']}), graph=g)
+    found = utils.overlapping('2019-05-01 11:00', '2019-05-01 13:00', graph=g)
+    assert sorted(found.place) == ['Hyytiälä', 'Puijo']
+    assert len(utils.overlapping('2019-05-01 11:00', '2019-05-01 13:00', place='Puijo', graph=g)) == 1
+    assert len(utils.overlapping('2019-05-01', '2019-05-03', classification='Class Ia', graph=g)) == 2
+    assert list(found.uri) == list(utils.events(g, start='2019-05-01T11:00+03:00', end='2019-05-01T13:00+03:00').uri)
+
+
+def test_graphs_have_their_own_index():
+    first, second = Graph(), Graph()
+    utils.event('2019-05-01', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=first)
+    assert len(utils.overlapping('2019-05-01', '2019-05-02', graph=first)) == 1
+    assert len(utils.overlapping('2019-05-01', '2019-05-02', graph=second)) == 0
@@ -0,0 +1,84 @@
+import pytest
+from rdflib import Graph, URIRef, BNode, Literal
+from rdflib.namespace import XSD
+import sqlitestore
+import utils
+
+ex = 'http://example.org/'
+triples = [(URIRef(ex + 'a'), URIRef(ex + 'p'), Literal('text', lang='fi')),
+           (URIRef(ex + 'a'), URIRef(ex + 'p'), Literal('1', datatype=XSD.integer)),
+           (URIRef(ex + 'a'), URIRef(ex + 'q'), BNode('b1')),
+           (BNode('b1'), URIRef(ex + 'p'), Literal('text'))]
+
+
+def test_committed_triples_persist(tmp_path):
+    path = str(tmp_path / 'graph.sqlite')
+    store = sqlitestore.SQLiteStore(path)
+    g = Graph(store, identifier=URIRef(ex + 'graph'))
+    for triple in triples:
+        g.add(triple)
+    g.commit()
+    store.close()
+
+    store = sqlitestore.SQLiteStore(path)
+    g = Graph(store, identifier=URIRef(ex + 'graph'))
+    assert sorted(g) == sorted(triples)
+    assert len(g) == 4
+    assert set(g.objects(URIRef(ex + 'a'), URIRef(ex + 'p'))) == {triples[0][2], triples[1][2]}
+    store.close()
+
+
+def test_rollback_drops_pending_writes(sqlite_graph):
+    sqlite_graph.add(triples[0])
+    sqlite_graph.commit()
+    sqlite_graph.add(triples[1])
+    sqlite_graph.rollback()
+    assert list(sqlite_graph) == [triples[0]]
+    # Terms interned in the rolled back transaction are interned again
+    sqlite_graph.add(triples[1])
+    assert len(sqlite_graph) == 2
+
+
+def test_contexts_share_the_store(sqlite_graph):
+    other = Graph(sqlite_graph.store, identifier=URIRef(ex + 'other'))
+    sqlite_graph.add(triples[0])
+    other.add(triples[0])
+    other.add(triples[2])
+    assert len(sqlite_graph) == 1 and len(other) == 2
+    assert {c.identifier for c in sqlite_graph.store.contexts()} == {URIRef(ex + 'graph'), URIRef(ex + 'other')}
+    other.remove((None, None, None))
+    assert len(other) == 0 and len(sqlite_graph) == 1
+
+
+def test_term_cache_is_bounded(sqlite_graph, monkeypatch):
+    monkeypatch.setattr(sqlitestore, 'cache_size', 10)
+    for i in range(50):
+        sqlite_graph.add((URIRef(ex + 's{}'.format(i)), URIRef(ex + 'p'), Literal(i)))
+    store = sqlite_graph.store
+    assert len(store._ids) == len(store._terms) == 10
+    assert len(sqlite_graph) == 50
+    assert sorted(int(o) for o in sqlite_graph.objects(None, URIRef(ex + 'p'))) == list(range(50))
+
+
+def test_events_match_the_memory_store(sqlite_graph):
+    memory = Graph()
+    for g in (memory, sqlite_graph):
+        utils.event('2019-05-01', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=g)
+        utils.event('2019-05-02', '09:00', '13:00', 'Class II', place='Värriö', graph=g)
+    assert len(sqlite_graph) == len(memory)
+    assert utils.events(sqlite_graph).equals(utils.events(memory))
+
+
+def test_failed_write_is_rolled_back(sqlite_graph, monkeypatch):
+    # A write that fails after adding its triples leaves nothing behind for the
+    # next write to commit
+    def fail(graph=None):
+        raise RuntimeError('commit failed')
+    utils.event('2019-05-01', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=sqlite_graph)
+    commit = utils._commit
+    monkeypatch.setattr(utils, '_commit', fail)
+    with pytest.raises(RuntimeError):
+        utils.event('2019-05-02', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=sqlite_graph)
+    monkeypatch.setattr(utils, '_commit', commit)
+    utils.event('2019-05-03', '10:00', '12:00', 'Class Ia', place='Hyytiälä', graph=sqlite_graph)
+    assert list(utils.events(sqlite_graph).beginning.dt.tz_convert('Europe/Helsinki').dt.day) == [1, 3]
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+import datacube
+import upload
+
+classes = {c: ('qb:' + c.split('#')[-1], None) for c in datacube.cube_classes}
+dataset = pd.DataFrame({'Month': [1, 2, 3], 'Mean': ['00:10', '00:20', '00:30']})
+
+
+@pytest.mark.parametrize('chunk_size', [1, 5, 7])
+def test_stream_small_chunks(orkg, chunk_size):
+    # Properties first used as objects (cs qb:dimension pN) keep their labels for
+    # later chunks that use them as predicates
+    uploader = upload.Uploader(orkg.host, classes, workers=1)
+    ids = uploader.stream(datacube.triples(dataset, 'Test', ['Month']), chunk_size=chunk_size)
+    uploader.close()
+    for column in (1, 2):
+        assert '<{}p{}>'.format(datacube.prefix(dataset, 'Test', ['Month']), column) in uploader._predicate_ids
+    assert len(ids) == 17
+    assert len(orkg.entities['statements']) == 16
+
+
+def test_classes_and_predicates_are_resolved_once(orkg):
+    g = datacube.graph(dataset, 'Test', ['Month'])
+    uploader = upload.Uploader(orkg.host, classes, workers=4)
+    uploader.store(g)
+    predicates = {p for s, p, o in g if p != upload.RDFS.label and not (p == upload.RDF.type and o in classes)}
+    used = {o for o in g.objects(None, upload.RDF.type) if o in classes}
+    assert orkg.requests[('GET', 'predicates')] == len(predicates)
+    assert orkg.requests[('GET', 'classes')] == len(used)
+    assert len(orkg.entities['statements']) == 16
+
+
+def test_journal_resumes_interrupted_upload(orkg, tmp_path):
+    journal = str(tmp_path / 'upload.journal')
+    # The 50th request fails, after the nodes and some statements are created
+    orkg.failure_rate = 1 / 50.0
+    uploader = upload.Uploader(orkg.host, classes, workers=1, retries=0, journal=journal)
+    with pytest.raises(Exception):
+        uploader.stream(datacube.triples(dataset, 'Test', ['Month']))
+    uploader.close()
+    created = len(orkg.entities['resources']) + len(orkg.entities['literals'])
+    assert len(orkg.entities['statements']) > 0
+
+    orkg.failure_rate = 0.0
+    uploader = upload.Uploader(orkg.host, classes, workers=1, journal=journal)
+    uploader.stream(datacube.triples(dataset, 'Test', ['Month']))
+    uploader.close()
+    # Nodes of the first attempt are not created again and no statement twice
+    assert created == 17
+    assert len(orkg.entities['resources']) + len(orkg.entities['literals']) == 17
+    statements = [(s['subject_id'], s['predicate_id'], s['object_id']) for s in orkg.entities['statements'].values()]
+    assert len(statements) == len(set(statements)) == 16
+
+    orkg.reset()
+    uploader = upload.Uploader(orkg.host, classes, workers=1, journal=journal)
+    uploader.stream(datacube.triples(dataset, 'Test', ['Month']))
+    uploader.close()
+    assert orkg.total == 0
+
+
+def test_failed_requests_are_retried(orkg):
+    orkg.failure_rate = 1 / 5.0
+    uploader = upload.Uploader(orkg.host, classes, workers=4, backoff_factor=0)
+    uploader.stream(datacube.triples(dataset, 'Test', ['Month']))
+    assert len(orkg.entities['statements']) == 16
@@ -1,19 +1,27 @@
-import requests
 import io
+import os
+import re
 import sys
 import csv
+import threading
+import weakref
+import itertools
+import inspect
+from functools import wraps
+from collections import OrderedDict
 import pandas as pd
 import numpy as np
-from io import StringIO
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from urllib.parse import urlencode
 from datetime import datetime, timedelta
 from pytz import timezone
-from matplotlib import pyplot as plt
 from dateutil import tz
 from hashlib import md5
-from rdflib import Graph, URIRef, Literal
-from rdflib.namespace import RDF, RDFS, XSD
-from rdflib.plugins.sparql.results.csvresults import CSVResultSerializer
+from intervals import EventIndex
+import metrics
+import queries
+import sessions
+import changes
 
 
 configuration = {
@@ -24,11 +32,11 @@ configuration = {
                            'd251e2,d282e2,d316e2,d355e2,d398e2,d447e2,d501e2,d562e2,d631e2,'\
                            'd708e2,d794e2,d891e2,d100e3,d112e3,d126e3,d141e3,d158e3,d178e3,d200e3',
         'num_var_less_than_10nm': 10,
-        'identifier': URIRef('http://sws.geonames.org/656888/'),
+        'identifier': 'http://sws.geonames.org/656888/',
         'name': 'Hyytiälä',
         'encoded_name':'hyytiaelae',
         'countryCode': 'FI',
-        'locationMap': URIRef('http://www.geonames.org/656888/hyytiaelae.html'),
+        'locationMap': 'http://www.geonames.org/656888/hyytiaelae.html',
         'latitude': '61.84562',
         'longitude': '24.29077',
         'package_id_descriptions': 'npfe_descriptions_at_hyytiaelae',
@@ -40,11 +48,11 @@ configuration = {
                            'ch17,ch18,ch19,ch20,ch21,ch22,ch23,ch24,ch25,ch26,ch27,ch28,ch29,ch30,ch31,ch32,'\
                            'ch33,ch34,ch35,ch36,ch37,ch38,ch39,ch40',
         'num_var_less_than_10nm': 10,
-        'identifier': URIRef('http://sws.geonames.org/640784/'),
+        'identifier': 'http://sws.geonames.org/640784/',
         'name': 'Puijo',
         'encoded_name': 'puijo',
         'countryCode': 'FI',
-        'locationMap': URIRef('http://www.geonames.org/640784/puijo.html'),
+        'locationMap': 'http://www.geonames.org/640784/puijo.html',
         'latitude': '62.91667',
         'longitude': '27.65'
     },
@@ -55,26 +63,26 @@ configuration = {
                            'd251e2,d282e2,d316e2,d355e2,d398e2,d447e2,d501e2,d562e2,d631e2,'\
                            'd708e2,d794e2,d891e2,d100e3,d112e3,d126e3,d141e3,d158e3,d178e3,d200e3',
         'num_var_less_than_10nm': 10,
-        'identifier': URIRef('http://sws.geonames.org/828747/'),
+        'identifier': 'http://sws.geonames.org/828747/',
         'name': 'Värriö',
         'encoded_name': 'vaerrioe',
         'countryCode': 'FI',
-        'locationMap': URIRef('http://www.geonames.org/828747/vaerrioe.html'),
+        'locationMap': 'http://www.geonames.org/828747/vaerrioe.html',
         'latitude': '67.46535',
         'longitude': '27.99231'
     },
     'Class Ia': {
-        'identifier': URIRef('http://avaa.tdata.fi/web/smart/smear/ClassIa'),
+        'identifier': 'http://avaa.tdata.fi/web/smart/smear/ClassIa',
         'label': 'Class Ia',
         'comment': 'Very clear and strong event'
     },
     'Class Ib': {
-        'identifier': URIRef('http://avaa.tdata.fi/web/smart/smear/ClassIb'),
+        'identifier': 'http://avaa.tdata.fi/web/smart/smear/ClassIb',
         'label': 'Class Ib',
         'comment': 'Unclear event'
     },
     'Class II': {
-        'identifier': URIRef('http://avaa.tdata.fi/web/smart/smear/ClassII'),
+        'identifier': 'http://avaa.tdata.fi/web/smart/smear/ClassII',
         'label': 'Class II',
         'comment': 'Event with little confidence level'
     }
@@ -83,84 +91,240 @@ configuration = {
 place = 'Hyytiälä'
 ns = 'http://avaa.tdata.fi/web/smart/smear/'
 tz_helsinki = timezone('Europe/Helsinki')
+smear_url = 'https://avaa.tdata.fi/smear-services/smeardata.jsp'
 
-LODE = dict()
-DUL = dict()
-GeoNames = dict()
-WGS84 = dict()
-SMEAR = dict()
-SimpleFeatures = dict()
-GeoSPARQL = dict()
-Time = dict()
-obo = dict()
-prov = dict()
-orkg = dict()
-
-LODE['Event'] = URIRef('http://linkedevents.org/ontology/Event')
-LODE['atPlace'] = URIRef('http://linkedevents.org/ontology/atPlace')
-LODE['atTime'] = URIRef('http://linkedevents.org/ontology/atTime')
-LODE['inSpace'] = URIRef('http://linkedevents.org/ontology/inSpace')
-LODE['involved'] = URIRef('http://linkedevents.org/ontology/involved')
-DUL['Place'] = URIRef('http://www.ontologydesignpatterns.org/ont/dul/DUL.owl#Place')
-GeoNames['Feature'] = URIRef('http://www.geonames.org/ontology#Feature')
-GeoNames['name'] = URIRef('http://www.geonames.org/ontology#name')
-GeoNames['countryCode'] = URIRef('http://www.geonames.org/ontology#countryCode')
-GeoNames['locationMap'] = URIRef('http://www.geonames.org/ontology#locationMap')
-WGS84['SpatialThing'] = URIRef('http://www.w3.org/2003/01/geo/wgs84_pos#SpatialThing')
-WGS84['lat'] = URIRef('http://www.w3.org/2003/01/geo/wgs84_pos#lat')
-WGS84['long'] = URIRef('http://www.w3.org/2003/01/geo/wgs84_pos#long')
-SMEAR['Classification'] = URIRef('http://avaa.tdata.fi/web/smart/smear/Classification')
-SMEAR['hasClassification'] = URIRef('http://avaa.tdata.fi/web/smart/smear/hasClassification')
-SimpleFeatures['Point'] = URIRef('http://www.opengis.net/ont/sf#Point')
-GeoSPARQL['asWKT'] = URIRef('http://www.opengis.net/ont/geosparql#asWKT')
-GeoSPARQL['wktLiteral'] = URIRef('http://www.opengis.net/ont/geosparql#wktLiteral')
-Time['Instant'] = URIRef('http://www.w3.org/2006/time#Instant')
-Time['Interval'] = URIRef('http://www.w3.org/2006/time#Interval')
-Time['TemporalUnit'] = URIRef('http://www.w3.org/2006/time#TemporalUnit')
-Time['hasTime'] = URIRef('http://www.w3.org/2006/time#hasTime')
-Time['hasBeginning'] = URIRef('http://www.w3.org/2006/time#hasBeginning')
-Time['hasEnd'] = URIRef('http://www.w3.org/2006/time#hasEnd')
-Time['inXSDDateTime'] = URIRef('http://www.w3.org/2006/time#inXSDDateTime')
-obo['is about'] = URIRef('http://purl.obolibrary.org/obo/IAO_0000136')
-obo['scalar measurement datum'] = URIRef('http://purl.obolibrary.org/obo/IAO_0000032')
-obo['has measurement unit label'] = URIRef('http://purl.obolibrary.org/obo/IAO_0000039')
-obo['has measurement value'] = URIRef('http://purl.obolibrary.org/obo/IAO_0000004')
-obo['time unit'] = URIRef('http://purl.obolibrary.org/obo/UO_0000003')
-obo['hour'] = URIRef('http://purl.obolibrary.org/obo/UO_0000032')
-obo['average value'] = URIRef('http://purl.obolibrary.org/obo/OBI_0000679')
-obo['is_specified_output_of'] = URIRef('http://purl.obolibrary.org/obo/OBI_0000312')
-obo['has_specified_output'] = URIRef('http://purl.obolibrary.org/obo/OBI_0000299')
-obo['arithmetic mean calculation'] = URIRef('http://purl.obolibrary.org/obo/OBI_0200079')
-obo['has_specified_input'] = URIRef('http://purl.obolibrary.org/obo/OBI_0000293')
-obo['data set'] = URIRef('http://purl.obolibrary.org/obo/IAO_0000100')
-obo['has part'] = URIRef('http://purl.obolibrary.org/obo/BFO_0000051')
-obo['data item'] = URIRef('http://purl.obolibrary.org/obo/IAO_0000027')
-obo['atmospheric aerosol formation event'] = URIRef('http://purl.obolibrary.org/obo/ENVO_01001359')
-prov['Entity'] = URIRef('http://www.w3.org/ns/prov#Entity')
-prov['Activity'] = URIRef('http://www.w3.org/ns/prov#Activity')
-prov['Agent'] = URIRef('http://www.w3.org/ns/prov#Agent')
-prov['wasDerivedFrom'] = URIRef('http://www.w3.org/ns/prov#wasDerivedFrom')
-prov['wasGeneratedBy'] = URIRef('http://www.w3.org/ns/prov#wasGeneratedBy')
-prov['used'] = URIRef('http://www.w3.org/ns/prov#used')
-prov['startedAtTime'] = URIRef('http://www.w3.org/ns/prov#startedAtTime')
-prov['endedAtTime'] = URIRef('http://www.w3.org/ns/prov#endedAtTime')
-orkg['ResearchResult'] = URIRef('http://orkg.org/core#ResearchResult')
-
-g = Graph()
-
-g.bind('lode', 'http://linkedevents.org/ontology/')
-g.bind('dul', 'http://www.ontologydesignpatterns.org/ont/dul/DUL.owl#')
-g.bind('gn', 'http://www.geonames.org/ontology#')
-g.bind('wgs84', 'http://www.w3.org/2003/01/geo/wgs84_pos#')
-g.bind('smear', 'http://avaa.tdata.fi/web/smart/smear/')
-g.bind('sf', 'http://www.opengis.net/ont/sf#')
-g.bind('geosparql', 'http://www.opengis.net/ont/geosparql#')
-g.bind('time', 'http://www.w3.org/2006/time#')
-g.bind('obo', 'http://purl.obolibrary.org/obo/')
-g.bind('prov', 'http://www.w3.org/ns/prov#')
-
-
-def data(date):
+# Local cache of SMEAR day downloads. Completed days never change on the server,
+# so each (table, variables, day, quality, averaging) is fetched once and kept
+# as a compressed columnar .npz file. The least recently used files are evicted
+# when the cache grows beyond cache_size bytes. With offline = True, data() is
+# served from the cache only.
+cache_directory = os.path.join('.cache', 'smear')
+cache_size = 2 ** 30
+offline = False
+
+# Connection pool shared by data() and data_range(). Failed requests are retried
+# with exponential backoff on connection errors and on overloaded server replies.
+pool_size = 8
+retries = 5
+backoff_factor = 0.5
+
+# Cache of query() results. Results are kept per graph version: every triple
+# added to a store advances its version, and removals change the size of the
+# graph, so a cached result is only returned while the graph is unchanged. At
+# most query_cache_size results and query_cache_bytes bytes of frames are kept,
+# the least recently used are evicted first. query_cache_size = 0 disables it.
+query_cache_size = 128
+query_cache_bytes = 2 ** 26
+
+# rdflib, the vocabularies below and the graph g are set up on first use of the
+# graph, so that fetching and plotting do not pay for them. Other modules get g
+# through graph() or utils.g.
+_setup_lock = threading.RLock()
+_vocabulary_ready = False
+_vocabularies = ('LODE', 'DUL', 'GeoNames', 'WGS84', 'SMEAR', 'SimpleFeatures', 'GeoSPARQL', 'Time', 'obo', 'prov', 'orkg',
+                 'Graph', 'URIRef', 'Literal', 'RDF', 'RDFS', 'XSD', 'graph_identifier')
+
+
+def _vocabulary():
+    global LODE, DUL, GeoNames, WGS84, SMEAR, SimpleFeatures, GeoSPARQL, Time, obo, prov, orkg
+    global Graph, URIRef, Literal, RDF, RDFS, XSD, graph_identifier
+    global _vocabulary_ready
+    if _vocabulary_ready:
+        return
+    with _setup_lock:
+        if _vocabulary_ready:
+            return
+        import rdflib.plugin
+        import rdflib.store
+        from rdflib import Graph, URIRef, Literal
+        from rdflib.namespace import RDF, RDFS, XSD
+
+        LODE = dict()
+        DUL = dict()
+        GeoNames = dict()
+        WGS84 = dict()
+        SMEAR = dict()
+        SimpleFeatures = dict()
+        GeoSPARQL = dict()
+        Time = dict()
+        obo = dict()
+        prov = dict()
+        orkg = dict()
+
+        LODE['Event'] = URIRef('http://linkedevents.org/ontology/Event')
+        LODE['atPlace'] = URIRef('http://linkedevents.org/ontology/atPlace')
+        LODE['atTime'] = URIRef('http://linkedevents.org/ontology/atTime')
+        LODE['inSpace'] = URIRef('http://linkedevents.org/ontology/inSpace')
+        LODE['involved'] = URIRef('http://linkedevents.org/ontology/involved')
+        DUL['Place'] = URIRef('http://www.ontologydesignpatterns.org/ont/dul/DUL.owl#Place')
+        GeoNames['Feature'] = URIRef('http://www.geonames.org/ontology#Feature')
+        GeoNames['name'] = URIRef('http://www.geonames.org/ontology#name')
+        GeoNames['countryCode'] = URIRef('http://www.geonames.org/ontology#countryCode')
+        GeoNames['locationMap'] = URIRef('http://www.geonames.org/ontology#locationMap')
+        WGS84['SpatialThing'] = URIRef('http://www.w3.org/2003/01/geo/wgs84_pos#SpatialThing')
+        WGS84['lat'] = URIRef('http://www.w3.org/2003/01/geo/wgs84_pos#lat')
+        WGS84['long'] = URIRef('http://www.w3.org/2003/01/geo/wgs84_pos#long')
+        SMEAR['Classification'] = URIRef('http://avaa.tdata.fi/web/smart/smear/Classification')
+        SMEAR['hasClassification'] = URIRef('http://avaa.tdata.fi/web/smart/smear/hasClassification')
+        SimpleFeatures['Point'] = URIRef('http://www.opengis.net/ont/sf#Point')
+        GeoSPARQL['asWKT'] = URIRef('http://www.opengis.net/ont/geosparql#asWKT')
+        GeoSPARQL['wktLiteral'] = URIRef('http://www.opengis.net/ont/geosparql#wktLiteral')
+        Time['Instant'] = URIRef('http://www.w3.org/2006/time#Instant')
+        Time['Interval'] = URIRef('http://www.w3.org/2006/time#Interval')
+        Time['TemporalUnit'] = URIRef('http://www.w3.org/2006/time#TemporalUnit')
+        Time['hasTime'] = URIRef('http://www.w3.org/2006/time#hasTime')
+        Time['hasBeginning'] = URIRef('http://www.w3.org/2006/time#hasBeginning')
+        Time['hasEnd'] = URIRef('http://www.w3.org/2006/time#hasEnd')
+        Time['inXSDDateTime'] = URIRef('http://www.w3.org/2006/time#inXSDDateTime')
+        obo['is about'] = URIRef('http://purl.obolibrary.org/obo/IAO_0000136')
+        obo['scalar measurement datum'] = URIRef('http://purl.obolibrary.org/obo/IAO_0000032')
+        obo['has measurement unit label'] = URIRef('http://purl.obolibrary.org/obo/IAO_0000039')
+        obo['has measurement value'] = URIRef('http://purl.obolibrary.org/obo/IAO_0000004')
+        obo['time unit'] = URIRef('http://purl.obolibrary.org/obo/UO_0000003')
+        obo['hour'] = URIRef('http://purl.obolibrary.org/obo/UO_0000032')
+        obo['average value'] = URIRef('http://purl.obolibrary.org/obo/OBI_0000679')
+        obo['is_specified_output_of'] = URIRef('http://purl.obolibrary.org/obo/OBI_0000312')
+        obo['has_specified_output'] = URIRef('http://purl.obolibrary.org/obo/OBI_0000299')
+        obo['arithmetic mean calculation'] = URIRef('http://purl.obolibrary.org/obo/OBI_0200079')
+        obo['has_specified_input'] = URIRef('http://purl.obolibrary.org/obo/OBI_0000293')
+        obo['data set'] = URIRef('http://purl.obolibrary.org/obo/IAO_0000100')
+        obo['has part'] = URIRef('http://purl.obolibrary.org/obo/BFO_0000051')
+        obo['data item'] = URIRef('http://purl.obolibrary.org/obo/IAO_0000027')
+        obo['atmospheric aerosol formation event'] = URIRef('http://purl.obolibrary.org/obo/ENVO_01001359')
+        prov['Entity'] = URIRef('http://www.w3.org/ns/prov#Entity')
+        prov['Activity'] = URIRef('http://www.w3.org/ns/prov#Activity')
+        prov['Agent'] = URIRef('http://www.w3.org/ns/prov#Agent')
+        prov['wasDerivedFrom'] = URIRef('http://www.w3.org/ns/prov#wasDerivedFrom')
+        prov['wasGeneratedBy'] = URIRef('http://www.w3.org/ns/prov#wasGeneratedBy')
+        prov['used'] = URIRef('http://www.w3.org/ns/prov#used')
+        prov['startedAtTime'] = URIRef('http://www.w3.org/ns/prov#startedAtTime')
+        prov['endedAtTime'] = URIRef('http://www.w3.org/ns/prov#endedAtTime')
+        orkg['ResearchResult'] = URIRef('http://orkg.org/core#ResearchResult')
+
+        # Persistent graph stores. open_graph() replaces g with a graph kept in an
+        # rdflib store plugin, by default the SQLite store of sqlitestore.py, so that
+        # annotations survive kernel restarts. Writes of event(), add_events(),
+        # duration() and parse() are committed as one transaction per call.
+        rdflib.plugin.register('SQLite', rdflib.store.Store, 'sqlitestore', 'SQLiteStore')
+        graph_identifier = URIRef('{}graph'.format(ns))
+
+        _vocabulary_ready = True
+
+
+def _setup():
+    global g
+    with _setup_lock:
+        if 'g' not in globals():
+            _vocabulary()
+            g = Graph()
+            _bind(g)
+    return g
+
+
+def graph():
+    # The graph g, created on first use
+    return g if 'g' in globals() else _setup()
+
+
+def _target(graph):
+    # The graph a function works on: its graph argument, or g by default
+    if graph is None:
+        return _setup()
+    _vocabulary()
+    return graph
+
+
+def _settings():
+    # Module settings of the SMEAR requests, for worker processes that do not
+    # inherit them (spawn start method)
+    return {name: globals()[name] for name in ('smear_url', 'cache_directory', 'cache_size', 'offline')}
+
+
+def _initialize(settings):
+    # Initializer of worker processes: apply the settings of the parent
+    globals().update(settings)
+
+
+def __getattr__(name):
+    # utils.g and the vocabularies for other modules, set up on first access
+    if name == 'g':
+        return graph()
+    if name in _vocabularies:
+        _vocabulary()
+        return globals()[name]
+    raise AttributeError("module '{}' has no attribute '{}'".format(__name__, name))
+
+
+def _bind(graph):
+    graph.bind('lode', 'http://linkedevents.org/ontology/')
+    graph.bind('dul', 'http://www.ontologydesignpatterns.org/ont/dul/DUL.owl#')
+    graph.bind('gn', 'http://www.geonames.org/ontology#')
+    graph.bind('wgs84', 'http://www.w3.org/2003/01/geo/wgs84_pos#')
+    graph.bind('smear', 'http://avaa.tdata.fi/web/smart/smear/')
+    graph.bind('sf', 'http://www.opengis.net/ont/sf#')
+    graph.bind('geosparql', 'http://www.opengis.net/ont/geosparql#')
+    graph.bind('time', 'http://www.w3.org/2006/time#')
+    graph.bind('obo', 'http://purl.obolibrary.org/obo/')
+    graph.bind('prov', 'http://www.w3.org/ns/prov#')
+
+
+def open_graph(path, store='SQLite'):
+    global g
+    _vocabulary()
+    graph = Graph(store, identifier=graph_identifier)
+    graph.open(path, create=True)
+    _bind(graph)
+    graph.commit()
+    g = graph
+    return g
+
+
+def close_graph():
+    global g
+    graph().close(commit_pending_transaction=True)
+    g = Graph()
+    _bind(g)
+
+
+def _commit(graph=None):
+    g = _target(graph)
+    if g.store.transaction_aware:
+        g.commit()
+    changes.commit(g)
+
+
+def _rollback(graph=None):
+    g = _target(graph)
+    if g.store.transaction_aware:
+        g.rollback()
+        changes.rollback(g)
+
+
+def _transaction(function):
+    # Roll back the pending writes of a write function that fails, so that the
+    # next successful write does not commit them
+    signature = inspect.signature(function)
+
+    @wraps(function)
+    def wrapper(*args, **kwargs):
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            _rollback(signature.bind(*args, **kwargs).arguments.get('graph'))
+            raise
+    return wrapper
+
+
+def _written(arguments):
+    # Triples added so far to the store of the graph a call writes to, for
+    # metrics; arguments are those of the call by name
+    written = arguments.get('graph')
+    return _counter(written if written is not None else graph())[1]
+
+
+@metrics.timed('data')
+def data(date, place=None):
+    place = place or globals()['place']
     time_from = timezone('Europe/Helsinki').localize(datetime.strptime(date, '%Y-%m-%d'))
     time_to = time_from + timedelta(days=1)
 
@@ -171,41 +335,272 @@ def data(date):
         print('Place not found in configuration [place = {}, places = {}]'.format(place, configuration.keys()))
         return list()
 
-    query = {'table': smear_table, 'quality': 'ANY', 'averaging': 'NONE', 'type': 'NONE',
-             'from': str(time_from), 'to': str(time_to), 'variables': smear_variables}
-    url = 'https://avaa.tdata.fi/smear-services/smeardata.jsp?' + urlencode(query)
-    response = requests.post(url)
+    query = _smear_query(smear_table, smear_variables, time_from, time_to)
+
+    path = _cache_path(query, date)
+    df = _cache_read(path)
+    if df is not None:
+        return df
+    if offline:
+        raise LookupError('Day not found in cache [place = {}, date = {}]'.format(place, date))
+
+    df = _fetch(query)
+
+    if time_to <= datetime.now(tz_helsinki):
+        _cache_write(path, df)
+
+    return df
+
+
+def data_range(start, end, place=None, workers=4, window=7):
+    # Fetch all days from start to end (inclusive) as one frame indexed by time.
+    # Days missing from the cache are requested in windows of consecutive days,
+    # with up to `workers` windows in flight over the pooled session.
+    place = place or globals()['place']
+    smear_table = configuration[place]['smear_table']
+    smear_variables = configuration[place]['smear_variables']
+    days = [day.strftime('%Y-%m-%d') for day in pd.date_range(start, end, freq='D')]
+
+    frames = dict()
+    missing = list()
+    for day in days:
+        time_from = tz_helsinki.localize(datetime.strptime(day, '%Y-%m-%d'))
+        query = _smear_query(smear_table, smear_variables, time_from, time_from + timedelta(days=1))
+        df = _cache_read(_cache_path(query, day))
+        if df is None:
+            missing.append(day)
+        else:
+            frames[day] = df
+    if missing and offline:
+        raise LookupError('Days not found in cache [place = {}, dates = {}]'.format(place, missing))
+
+    def fetch(window_days):
+        time_from = tz_helsinki.localize(datetime.strptime(window_days[0], '%Y-%m-%d'))
+        time_to = tz_helsinki.localize(datetime.strptime(window_days[-1], '%Y-%m-%d')) + timedelta(days=1)
+        query = _smear_query(smear_table, smear_variables, time_from, time_to)
+        df = _fetch(query)
+        dates = _times(df).strftime('%Y-%m-%d')
+        now = datetime.now(tz_helsinki)
+        result = dict()
+        for day in window_days:
+            day_df = df[dates == day].reset_index(drop=True)
+            time_from = tz_helsinki.localize(datetime.strptime(day, '%Y-%m-%d'))
+            time_to = time_from + timedelta(days=1)
+            if time_to <= now:
+                _cache_write(_cache_path(_smear_query(smear_table, smear_variables, time_from, time_to), day), day_df)
+            result[day] = day_df
+        return result
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for result in executor.map(fetch, _windows(missing, window)):
+            frames.update(result)
+
+    df = pd.concat([frames[day] for day in days], ignore_index=True)
+    df.index = _times(df)
+
+    return df
+
+
+def _smear_query(smear_table, smear_variables, time_from, time_to):
+    return {'table': smear_table, 'quality': 'ANY', 'averaging': 'NONE', 'type': 'NONE',
+            'from': str(time_from), 'to': str(time_to), 'variables': smear_variables}
+
+
+def _fetch(query):
+    response = _session().post(smear_url + '?' + urlencode(query))
+    response.raise_for_status()
+    with metrics.timer('data.csv'):
+        return pd.read_csv(io.StringIO(response.text))
+
+
+_session_instance = None
+_session_lock = threading.Lock()
+
+
+def _session():
+    global _session_instance
+    with _session_lock:
+        if _session_instance is None:
+            _session_instance = sessions.session(retries, backoff_factor, pool_size)
+        return _session_instance
+
+
+def _forked():
+    # A forked worker must not share the pooled connections of its parent
+    global _session_instance, _session_lock
+    _session_instance = None
+    _session_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_forked)
+
+
+def _windows(days, size):
+    # Split a sorted list of days into runs of at most `size` consecutive days
+    windows = list()
+    for day in days:
+        if windows and len(windows[-1]) < size and \
+                datetime.strptime(day, '%Y-%m-%d') - datetime.strptime(windows[-1][-1], '%Y-%m-%d') == timedelta(days=1):
+            windows[-1].append(day)
+        else:
+            windows.append([day])
+    return windows
+
+
+def spectrum(df, place=None):
+    # The size distribution columns of a data() frame as a (time x size bin) float32 array
+    place = place or globals()['place']
+    variables = configuration[place]['smear_variables'].split(',')
+    columns = {column.split('.')[-1]: column for column in df.columns}
+    missing = [variable for variable in variables if variable not in columns]
+    if missing:
+        raise LookupError('Variables not found in data [place = {}, variables = {}]'.format(place, missing))
+    return df[[columns[variable] for variable in variables]].values.astype(np.float32)
+
+
+def _times(df):
+    if 'samptime' in df.columns:
+        return pd.DatetimeIndex(pd.to_datetime(df['samptime']), name='time')
+    columns = ['Year', 'Month', 'Day', 'Hour', 'Minute', 'Second']
+    return pd.DatetimeIndex(pd.to_datetime(df[columns].rename(columns=str.lower)), name='time')
+
+
+def _cache_path(query, date):
+    key = '|'.join([query['table'], query['variables'], date, query['quality'], query['averaging'], query['type']])
+    return os.path.join(cache_directory, query['table'], '{}-{}.npz'.format(date, md5(key.encode()).hexdigest()[:12]))
+
+
+def _cache_read(path):
+    if not os.path.exists(path):
+        return None
+    # Touch the file so that eviction removes the least recently used days first
+    os.utime(path)
+    with np.load(path) as z:
+        return pd.DataFrame({column: z[column] for column in z.files})
+
+
+def _cache_write(path, df):
+    columns = dict()
+    for column in df.columns:
+        values = df[column].values
+        columns[column] = values.astype(str) if values.dtype == object else values
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as f:
+        np.savez_compressed(f, **columns)
+    os.replace(tmp, path)
+    _cache_evict(os.path.getsize(path))
+
+
+_cache_bytes = None
+_cache_lock = threading.Lock()
 
-    return pd.read_csv(io.StringIO(response.text))
 
+def _cache_entries():
+    for directory, _, files in os.walk(cache_directory):
+        for file in files:
+            if file.endswith('.npz'):
+                path = os.path.join(directory, file)
+                stat = os.stat(path)
+                yield stat.st_mtime, stat.st_size, path
 
-def plot(data):
-    d = data.copy(deep=True)
-    d = d.ix[:, 6:].values
-    m = len(d)
-    n = len(d[0])
-    x = range(0, m)
-    y = range(0, n)
-    x, y = np.meshgrid(x, y)
-    z = np.transpose(np.array([row[1:] for row in d]).astype(np.float))
+
+def _cache_evict(added):
+    with _cache_lock:
+        _cache_evict_locked(added)
+
+
+def _cache_evict_locked(added):
+    global _cache_bytes
+    if _cache_bytes is None:
+        _cache_bytes = sum(size for _, size, _ in _cache_entries())
+    else:
+        _cache_bytes += added
+    if _cache_bytes <= cache_size:
+        return
+    for _, size, path in sorted(_cache_entries()):
+        if _cache_bytes <= cache_size:
+            break
+        os.remove(path)
+        _cache_bytes -= size
+
+
+def plot(data, place=None):
+    from matplotlib import pyplot as plt
+    z = spectrum(data, place).T
     plt.figure(figsize=(10, 5), dpi=100)
-    plt.pcolormesh(x, y, z)
-    plt.plot((0, x.max()), (y.max()/2, y.max()/2), "r-")
-    plt.colorbar()
-    plt.xlim(right=m-1)
-    x_ticks = np.arange(x.min(), x.max(), 6)
-    x_labels = range(x_ticks.size)
-    plt.xticks(x_ticks, x_labels)
-    plt.xlabel('Hours')
-    y_ticks = np.arange(y.min(), y.max(), 6)
-    y_labels = ['3.16', '6.31', '12.6', '25.1', '50.1', '100']
-    plt.yticks(y_ticks, y_labels)
-    plt.ylabel('Diameter [nm]')
-    plt.ylim(top=n-1)
+    plt.colorbar(_draw(plt.gca(), z, place))
     plt.show()
 
+
+def _draw(ax, z, place=None):
+    # Draw a (size bin x time) matrix on ax and return the mesh for a colorbar
+    n, m = z.shape
+    mesh = ax.pcolormesh(z)
+    ax.plot((0, m), (n / 2, n / 2), 'r-')
+    ax.set_xlim(0, m)
+    ax.set_ylim(0, n)
+    x_ticks = np.arange(0, m, 6)
+    ax.set_xticks(x_ticks)
+    ax.set_xticklabels(range(x_ticks.size))
+    ax.set_xlabel('Hours')
+    y_ticks = np.arange(0, n, 6)
+    ax.set_yticks(y_ticks + 0.5)
+    ax.set_yticklabels([_size_labels(place)[i] for i in y_ticks])
+    ax.set_ylabel('Diameter [nm]')
+    return mesh
+
+
+def diameters(place=None):
+    # Size bin diameters in nm from the variable names, e.g. d316e1 -> 3.16 and
+    # d100e3 -> 100. Channels whose names carry no diameter (ch01) are nan.
+    place = place or globals()['place']
+    values = list()
+    for variable in configuration[place]['smear_variables'].split(','):
+        match = re.match(r'^d(\d)(\d+)e(\d+)$', variable)
+        if match:
+            values.append(float('{}.{}e{}'.format(match.group(1), match.group(2), int(match.group(3)) - 1)))
+        else:
+            values.append(np.nan)
+    return np.array(values)
+
+
+def _modes(spectra, diameters):
+    # Diameter of the maximum concentration along the last (size bin) axis of
+    # spectra, nan where all bins are nan
+    present = ~np.isnan(spectra)
+    mode = diameters[np.argmax(np.where(present, spectra, -np.inf), axis=-1)]
+    return np.where(present.any(axis=-1), mode, np.nan)
+
+
+def _slopes(x, y, mask):
+    # Least squares slope of y over x along axis 1 where mask, nan with fewer
+    # than two points. Used for the growth of the mode diameter by detection and
+    # rates.
+    weight = mask & ~np.isnan(y)
+    n = weight.sum(axis=1)
+    with np.errstate(all='ignore'):
+        x_mean = np.where(weight, x, 0).sum(axis=1) / n
+        y_mean = np.where(weight, y, 0).sum(axis=1) / n
+        dx = np.where(weight, x - x_mean[:, np.newaxis], 0)
+        dy = np.where(weight, y - y_mean[:, np.newaxis], 0)
+        slope = (dx * dy).sum(axis=1) / (dx * dx).sum(axis=1)
+    return np.where(n >= 2, slope, np.nan)
+
+
+def _size_labels(place=None):
+    place = place or globals()['place']
+    variables = configuration[place]['smear_variables'].split(',')
+    return ['{:.3g}'.format(d) if not np.isnan(d) else v for d, v in zip(diameters(place), variables)]
+
     
-def event(day, beginning, end, classification):
+@metrics.timed('event', graph=_written)
+@_transaction
+def event(day, beginning, end, classification, place=None, graph=None):
+    # place defaults to the module place and graph to g
+    place = place or globals()['place']
+    g = _target(graph)
     point = 'POINT ({} {})'.format(configuration[place]['longitude'], configuration[place]['latitude'])
 
     beginning_datetime = tz_helsinki.localize(datetime.strptime('{} {}'.format(day, beginning), '%Y-%m-%d %H:%M'))
@@ -220,8 +615,8 @@ def event(day, beginning, end, classification):
     time_uri = URIRef('{}{}'.format(ns, md5(time_isoformat.encode()).hexdigest()))
     beginning_uri = URIRef('{}{}'.format(ns, md5(beginning_isoformat.encode()).hexdigest()))
     end_uri = URIRef('{}{}'.format(ns, md5(end_isoformat.encode()).hexdigest()))
-    place_uri = configuration[place]['identifier']
-    classification_uri = configuration[classification]['identifier']
+    place_uri = URIRef(configuration[place]['identifier'])
+    classification_uri = URIRef(configuration[classification]['identifier'])
 
     g.add((event_uri, RDF.type, LODE['Event']))
     g.add((event_uri, LODE['atPlace'], place_uri))
@@ -232,7 +627,7 @@ def event(day, beginning, end, classification):
     g.add((place_uri, RDF.type, GeoNames['Feature']))
     g.add((place_uri, GeoNames['name'], Literal(configuration[place]['name'], datatype=XSD.string)))
     g.add((place_uri, GeoNames['countryCode'], Literal(configuration[place]['countryCode'], datatype=XSD.string)))
-    g.add((place_uri, GeoNames['locationMap'], configuration[place]['locationMap']))
+    g.add((place_uri, GeoNames['locationMap'], URIRef(configuration[place]['locationMap'])))
     g.add((place_uri, WGS84['lat'], Literal(configuration[place]['latitude'], datatype=XSD.double)))
     g.add((place_uri, WGS84['long'], Literal(configuration[place]['longitude'], datatype=XSD.double)))
     g.add((classification_uri, RDF.type, SMEAR['Classification']))
@@ -249,60 +644,220 @@ def event(day, beginning, end, classification):
     g.add((end_uri, RDF.type, Time['Instant']))
     g.add((end_uri, Time['inXSDDateTime'], Literal(end_isoformat, datatype=XSD.dateTime)))
 
+    _commit(g)
 
-def events():
-    q = """
-    SELECT ?place ?beginning ?end ?classification ?uri
-    WHERE {
-    ?uri rdf:type lode:Event .
-    ?uri lode:atTime ?atTime .
-    ?atTime time:hasBeginning ?hasBeginning .
-    ?hasBeginning time:inXSDDateTime ?beginning .
-    ?atTime time:hasEnd ?hasEnd .
-    ?hasEnd time:inXSDDateTime ?end .
-    ?uri lode:atPlace ?atPlace .
-    ?atPlace gn:name ?place .
-    ?atPlace wgs84:lat ?latitude .
-    ?atPlace wgs84:long ?longitude .
-    ?uri smear:hasClassification ?hasClassification .
-    ?hasClassification rdfs:label ?classification .
-    }
-    ORDER BY ASC(?beginning)
-    """
-    
-    df = query(q, {'classification': 'str', 'place': 'str', 'latitude': 'float', 'longitude': 'float', 'uri': 'str'})
+    ix = _index(g)
+    if ix is not None:
+        ix.add(str(event_uri), configuration[place]['name'], configuration[classification]['label'],
+               pd.Timestamp(beginning_datetime).value, pd.Timestamp(end_datetime).value)
+
+
+@metrics.timed('add_events', graph=_written)
+@_transaction
+def add_events(df, batch_size=10000, place=None, graph=None):
+    # Bulk variant of event() for a frame with columns day, beginning, end,
+    # classification and optionally place. Produces the same triples as calling
+    # event() for every row, but asserts the triples about places, geometries and
+    # classifications once, derives timestamps and URIs column-wise and inserts
+    # the triples in batches with addN.
+    g = _target(graph)
+    df = df.reset_index(drop=True)
+    places = df['place'] if 'place' in df.columns else pd.Series(place or globals()['place'], index=df.index)
+
+    def timestamps(column):
+        local = pd.DatetimeIndex(pd.to_datetime(df['day'] + ' ' + df[column], format='%Y-%m-%d %H:%M'))
+        ambiguous = np.zeros(len(local), dtype=bool)
+        try:
+            aware = local.tz_localize('Europe/Helsinki', ambiguous=ambiguous, nonexistent='NaT')
+        except TypeError:
+            # pandas < 0.24
+            aware = local.tz_localize('Europe/Helsinki', ambiguous=ambiguous, errors='coerce')
+        # Times in the spring gap do not exist locally; like pytz localize() in
+        # event(), they are taken at the standard offset, +02:00
+        values = np.where(aware.isna(), local.asi8 - pd.Timedelta('2h').value, aware.asi8)
+        instants[column] = values
+        offset = (local.asi8 - values) // pd.Timedelta('1min').value
+        sign = np.where(offset < 0, '-', '+')
+        offset = np.abs(offset)
+        suffix = ['{}{:02d}:{:02d}'.format(s, o // 60, o % 60) for s, o in zip(sign, offset)]
+        return list(local.strftime('%Y-%m-%dT%H:%M:%S') + pd.Index(suffix))
+
+    hashes = dict()
+    instants = dict()
+
+    def uri(text):
+        if text not in hashes:
+            hashes[text] = URIRef('{}{}'.format(ns, md5(text.encode()).hexdigest()))
+        return hashes[text]
+
+    beginning_isoformats = timestamps('beginning')
+    end_isoformats = timestamps('end')
+
+    static = set()
+    quads = list()
+
+    def emit(triples):
+        quads.extend((s, p, o, g) for s, p, o in triples)
+        if len(quads) >= batch_size:
+            g.addN(quads)
+            del quads[:]
+
+    for day, event_place, classification, beginning_isoformat, end_isoformat in \
+            zip(df['day'], places, df['classification'], beginning_isoformats, end_isoformats):
+        point = 'POINT ({} {})'.format(configuration[event_place]['longitude'], configuration[event_place]['latitude'])
+        time_isoformat = '{}/{}'.format(beginning_isoformat, end_isoformat)
+        event_uri = uri('{}{}'.format(day, event_place))
+        geometry_uri = uri(point)
+        time_uri = uri(time_isoformat)
+        beginning_uri = uri(beginning_isoformat)
+        end_uri = uri(end_isoformat)
+        place_uri = URIRef(configuration[event_place]['identifier'])
+        classification_uri = URIRef(configuration[classification]['identifier'])
+
+        if (event_place, classification) not in static:
+            static.add((event_place, classification))
+            emit(_place_triples(event_place, place_uri, geometry_uri, point))
+            emit(_classification_triples(classification, classification_uri))
+
+        emit([
+            (event_uri, RDF.type, LODE['Event']),
+            (event_uri, LODE['atPlace'], place_uri),
+            (event_uri, LODE['inSpace'], geometry_uri),
+            (event_uri, LODE['atTime'], time_uri),
+            (event_uri, SMEAR['hasClassification'], classification_uri),
+            (time_uri, RDF.type, Time['Interval']),
+            (time_uri, Time['hasBeginning'], beginning_uri),
+            (time_uri, Time['hasEnd'], end_uri),
+            (beginning_uri, RDF.type, Time['Instant']),
+            (beginning_uri, Time['inXSDDateTime'], Literal(beginning_isoformat, datatype=XSD.dateTime)),
+            (end_uri, RDF.type, Time['Instant']),
+            (end_uri, Time['inXSDDateTime'], Literal(end_isoformat, datatype=XSD.dateTime))
+        ])
+    if quads:
+        g.addN(quads)
+    _commit(g)
+
+    ix = _index(g)
+    if ix is not None:
+        for day, event_place, classification, beginning, end in \
+                zip(df['day'], places, df['classification'], instants['beginning'], instants['end']):
+            ix.add(str(uri('{}{}'.format(day, event_place))), configuration[event_place]['name'],
+                   configuration[classification]['label'], int(beginning), int(end))
+
+
+def _place_triples(place, place_uri, geometry_uri, point):
+    return [
+        (place_uri, RDF.type, DUL['Place']),
+        (place_uri, RDF.type, GeoNames['Feature']),
+        (place_uri, GeoNames['name'], Literal(configuration[place]['name'], datatype=XSD.string)),
+        (place_uri, GeoNames['countryCode'], Literal(configuration[place]['countryCode'], datatype=XSD.string)),
+        (place_uri, GeoNames['locationMap'], URIRef(configuration[place]['locationMap'])),
+        (place_uri, WGS84['lat'], Literal(configuration[place]['latitude'], datatype=XSD.double)),
+        (place_uri, WGS84['long'], Literal(configuration[place]['longitude'], datatype=XSD.double)),
+        (geometry_uri, RDF.type, SimpleFeatures['Point']),
+        (geometry_uri, RDF.type, WGS84['SpatialThing']),
+        (geometry_uri, GeoSPARQL['asWKT'], Literal(point, datatype=GeoSPARQL['wktLiteral']))
+    ]
+
+
+def _classification_triples(classification, classification_uri):
+    return [
+        (classification_uri, RDF.type, SMEAR['Classification']),
+        (classification_uri, RDFS.label, Literal(configuration[classification]['label'], datatype=XSD.string)),
+        (classification_uri, RDFS.comment, Literal(configuration[classification]['comment'], datatype=XSD.string))
+    ]
+
+
+@metrics.timed('events')
+def events(graph=None, place=None, start=None, end=None):
+    # Events of g (or graph), optionally of one place (a configuration key) and
+    # overlapping [start, end]; naive start and end are taken as Helsinki time
+    bindings = dict()
+    if place:
+        _vocabulary()
+        bindings['place'] = Literal(configuration[place]['name'], datatype=XSD.string)
+    for variable, t in (('from', start), ('to', end)):
+        if t is not None:
+            _vocabulary()
+            t = pd.Timestamp(t) if pd.Timestamp(t).tzinfo else pd.Timestamp(t).tz_localize('Europe/Helsinki')
+            bindings[variable] = Literal(t.isoformat(), datatype=XSD.dateTime)
+    q = queries.prepared('events' if start is None and end is None else 'events_in_window')
+
+    df = query(q, {'classification': 'str', 'place': 'str', 'latitude': 'float', 'longitude': 'float', 'uri': 'str'},
+               graph=graph, bindings=bindings)
     df.beginning = pd.to_datetime(df.beginning, utc=True).dt.tz_convert('Europe/Helsinki')
     df.end = pd.to_datetime(df.end, utc=True).dt.tz_convert('Europe/Helsinki')
     
     return df
 
-def duration(value, df):
-    event_uris = df['uri']
+# Interval indexes of the events in a graph, built from events() on first use
+# and then kept up to date by event() and add_events(). rdflib graphs compare
+# by identifier only, and station graphs or graphs of open_graph() share
+# identifiers, so indexes are kept per store and identifier.
+_indexes = weakref.WeakKeyDictionary()
+
+
+def _index(graph):
+    # The index of graph if it was built, else None
+    return _indexes.get(graph.store, {}).get(graph.identifier)
+
+
+def _drop_index(graph):
+    # Rebuild the index of graph on next use
+    _indexes.get(graph.store, {}).pop(graph.identifier, None)
+
+
+def index(graph=None):
+    graph = _target(graph)
+    ix = _index(graph)
+    if ix is None:
+        df = events(graph)
+        ix = EventIndex()
+        for row in df.itertuples(index=False):
+            ix.add(row.uri, row.place, row.classification, row.beginning.value, row.end.value)
+        _indexes.setdefault(graph.store, dict())[graph.identifier] = ix
+    return ix
+
+
+def overlapping(start, end, place=None, classification=None, graph=None):
+    # Events that overlap [start, end] through the interval index, as an events() frame.
+    # Naive start and end are taken as Helsinki time; place is a configuration key.
+    start, end = [pd.Timestamp(t) if pd.Timestamp(t).tzinfo else pd.Timestamp(t).tz_localize('Europe/Helsinki')
+                  for t in (start, end)]
+    name = configuration[place]['name'] if place else None
+    label = configuration[classification]['label'] if classification else None
+    found = index(graph).overlapping(start.value, end.value, name, label)
+    df = pd.DataFrame(found, columns=['place', 'classification', 'beginning', 'end', 'uri'])
+    df.beginning = pd.to_datetime(df.beginning.astype(np.int64), utc=True).dt.tz_convert('Europe/Helsinki')
+    df.end = pd.to_datetime(df.end.astype(np.int64), utc=True).dt.tz_convert('Europe/Helsinki')
+    return df[['place', 'beginning', 'end', 'classification', 'uri']]
+
+
+@metrics.timed('duration', graph=_written)
+@_transaction
+def duration(value, df, graph=None):
+    g = _target(graph)
+    # Provenance nodes are content-addressed: the data set by its sorted event URIs,
+    # the calculation and datum by the data set, the computation and the value.
+    # Repeating a calculation over the same events returns the existing datum.
     unit = 'hour'
     datetime_now = datetime.utcnow().replace(tzinfo=tz.tzutc()).astimezone(tz.tzlocal())
 
-    datum_uri = URIRef('{}{}'.format(ns, md5('{}{}'.format(datetime_now, 'datum').encode()).hexdigest()))
-    arithmetic_mean_calculation_uri = URIRef('{}{}'.format(ns, md5('{}{}'.format(datetime_now, 'arithmetic_mean_calculation').encode()).hexdigest()))
-    dataset_uri = URIRef('{}{}'.format(ns, md5('{}{}'.format(datetime_now, 'dataset').encode()).hexdigest()))
-
-    g.add((obo['atmospheric aerosol formation event'], RDFS.label, Literal('atmospheric aerosol formation event')))
-    g.add((obo['scalar measurement datum'], RDFS.label, Literal('scalar measurement datum')))
-    g.add((obo['has measurement unit label'], RDFS.label, Literal('has measurement unit label')))
-    g.add((obo['has measurement value'], RDFS.label, Literal('has measurement value')))
-    g.add((obo['time unit'], RDFS.label, Literal('time unit')))
-    g.add((obo['hour'], RDFS.label, Literal('hour')))
-    g.add((obo['average value'], RDFS.label, Literal('average value')))
-    g.add((obo['is_specified_output_of'], RDFS.label, Literal('is_specified_output_of')))
-    g.add((obo['has_specified_output'], RDFS.label, Literal('has_specified_output')))
-    g.add((obo['arithmetic mean calculation'], RDFS.label, Literal('arithmetic mean calculation')))
-    g.add((obo['has_specified_input'], RDFS.label, Literal('has_specified_input')))
-    g.add((obo['data set'], RDFS.label, Literal('data set')))
-    g.add((obo['has part'], RDFS.label, Literal('has part')))
-    g.add((obo['data item'], RDFS.label, Literal('data item')))
+    dataset_uri = _dataset(df['uri'], g)
+    calculation_key = '{}{}{}'.format(dataset_uri, 'arithmetic_mean_calculation', value)
+    arithmetic_mean_calculation_uri = URIRef('{}{}'.format(ns, md5(calculation_key.encode()).hexdigest()))
+    datum_uri = URIRef('{}{}'.format(ns, md5('{}{}'.format(calculation_key, 'datum').encode()).hexdigest()))
+
+    if (datum_uri, RDF.type, obo['scalar measurement datum']) in g:
+        return datum_uri.toPython()
+
+    _labels([obo['atmospheric aerosol formation event'], obo['scalar measurement datum'],
+             obo['has measurement unit label'], obo['has measurement value'], obo['time unit'], obo['hour'],
+             obo['average value'], obo['is_specified_output_of'], obo['has_specified_output'],
+             obo['arithmetic mean calculation'], obo['has_specified_input']], g)
 
     g.add((obo['hour'], RDF.type, obo['time unit']))
     g.add((arithmetic_mean_calculation_uri, RDF.type, obo['arithmetic mean calculation']))
-    g.add((dataset_uri, RDF.type, obo['data set']))
     g.add((datum_uri, RDF.type, obo['scalar measurement datum']))
     g.add((datum_uri, RDF.type, obo['average value']))
     g.add((datum_uri, RDF.type, orkg['ResearchResult']))
@@ -314,11 +869,6 @@ def duration(value, df):
     g.add((arithmetic_mean_calculation_uri, obo['has_specified_output'], datum_uri))
     g.add((arithmetic_mean_calculation_uri, obo['has_specified_input'], dataset_uri))
 
-    for event_uri in event_uris:
-        g.add((URIRef(event_uri), RDF.type, obo['data item']))
-        g.add((dataset_uri, obo['has part'], URIRef(event_uri)))
-
-    g.add((dataset_uri, RDF.type, prov['Entity']))
     g.add((datum_uri, RDF.type, prov['Entity']))
     g.add((arithmetic_mean_calculation_uri, RDF.type, prov['Activity']))
     g.add((datum_uri, prov['wasDerivedFrom'], dataset_uri))
@@ -326,15 +876,145 @@ def duration(value, df):
     g.add((arithmetic_mean_calculation_uri, prov['used'], dataset_uri))
     g.add((arithmetic_mean_calculation_uri, prov['startedAtTime'], Literal(datetime_now.isoformat(), datatype=XSD.dateTime)))
     g.add((arithmetic_mean_calculation_uri, prov['endedAtTime'], Literal(datetime_now.isoformat(), datatype=XSD.dateTime)))
+    _commit(g)
     
     return datum_uri.toPython()
 
-def parse(url):
-    g.parse(url, format='rdfa')
-    
-def query(q, dtype={}):
-    serializer = CSVResultSerializer(g.query(q))
-    output = io.BytesIO()
-    serializer.serialize(output)
+
+def _dataset(event_uris, graph=None):
+    g = _target(graph)
+    # Data set of the given events, identified by the hash of its sorted members.
+    # Members are only added when the data set is new to the graph.
+    event_uris = sorted(set(str(uri) for uri in event_uris))
+    dataset_uri = URIRef('{}{}'.format(ns, md5('{}{}'.format('\n'.join(event_uris), 'dataset').encode()).hexdigest()))
+    if (dataset_uri, RDF.type, obo['data set']) in g:
+        return dataset_uri
+
+    _labels([obo['data set'], obo['has part'], obo['data item']], g)
+    quads = [(dataset_uri, RDF.type, obo['data set'], g), (dataset_uri, RDF.type, prov['Entity'], g)]
+    for event_uri in event_uris:
+        quads.append((URIRef(event_uri), RDF.type, obo['data item'], g))
+        quads.append((dataset_uri, obo['has part'], URIRef(event_uri), g))
+    g.addN(quads)
+    return dataset_uri
+
+
+def _labels(terms, graph=None, vocabulary=None):
+    g = _target(graph)
+    # Assert the rdfs:label of terms of vocabulary (obo by default) once per graph,
+    # using the key of the term as label
+    for label, term in (vocabulary or obo).items():
+        if term in terms and (term, RDFS.label, Literal(label)) not in g:
+            g.add((term, RDFS.label, Literal(label)))
+
+
+@metrics.timed('parse', graph=_written)
+@_transaction
+def parse(url, graph=None):
+    import documents
+    g = _target(graph)
+    with metrics.timer('parse.rdfa'):
+        nt = documents.triples(url, _session())
+    g.parse(data=nt, format='nt')
+    _commit(g)
+    # Parsed documents may describe events, rebuild the index on next use
+    _drop_index(g)
+
+
+@metrics.timed('parse_many', graph=_written)
+@_transaction
+def parse_many(urls, workers=None, graph=None):
+    # Parse many article URLs or local files in a process pool and merge them into g
+    import documents
+    g = _target(graph)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for nt in executor.map(documents.triples, urls):
+            g.parse(data=nt, format='nt')
+    _commit(g)
+    _drop_index(g)
     
-    return pd.read_csv(StringIO(output.getvalue().decode()), dtype=dtype)
\ No newline at end of file
+@metrics.timed('query')
+def query(q, dtype={}, graph=None, bindings=None):
+    # SPARQL query over g (or graph) as a typed frame. q is query text or a
+    # prepared query of the queries registry; bindings maps variable names to
+    # terms, as initBindings of rdflib
+    g = _target(graph)
+    metrics.count('queries')
+    if not query_cache_size:
+        return queries.frame(g.query(q, initBindings=bindings or {}), dtype)
+
+    # Prepared queries are kept by the registry, so they are keys by identity
+    key = (_version(g), _normalized(q) if isinstance(q, str) else q,
+           tuple(sorted((str(k), v.n3()) for k, v in (bindings or {}).items())),
+           tuple(sorted((column, str(column_dtype)) for column, column_dtype in dtype.items())))
+    with _query_cache_lock:
+        df = _query_cache.get(key)
+        if df is not None:
+            _query_cache.move_to_end(key)
+            _query_cache_stats['hits'] += 1
+            return df.copy()
+        _query_cache_stats['misses'] += 1
+
+    df = queries.frame(g.query(q, initBindings=bindings or {}), dtype)
+    size = int(df.memory_usage(index=True, deep=True).sum())
+    with _query_cache_lock:
+        if key not in _query_cache and size <= query_cache_bytes:
+            _query_cache[key] = df.copy()
+            _query_cache_sizes[key] = size
+            _query_cache_stats['bytes'] += size
+            while len(_query_cache) > query_cache_size or _query_cache_stats['bytes'] > query_cache_bytes:
+                evicted, _ = _query_cache.popitem(last=False)
+                _query_cache_stats['bytes'] -= _query_cache_sizes.pop(evicted)
+                _query_cache_stats['evictions'] += 1
+    return df
+
+
+_query_cache = OrderedDict()
+_query_cache_sizes = dict()
+_query_cache_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'bytes': 0}
+_query_cache_lock = threading.Lock()
+# Per store: [serial number of the store, number of triples added]
+_versions = weakref.WeakKeyDictionary()
+_serials = itertools.count()
+
+
+def query_cache_info():
+    # Hit and miss counts, evictions, cached results and their bytes
+    with _query_cache_lock:
+        return dict(_query_cache_stats, entries=len(_query_cache), maxsize=query_cache_size,
+                    maxbytes=query_cache_bytes)
+
+
+def clear_query_cache():
+    with _query_cache_lock:
+        _query_cache.clear()
+        _query_cache_sizes.clear()
+        _query_cache_stats.update(hits=0, misses=0, evictions=0, bytes=0)
+
+
+def _version(graph):
+    # Version of graph: its store, the triples added to the store and its size.
+    # The store dispatches an event for every added triple; not all stores do for
+    # removals, which the size accounts for.
+    version = _counter(graph)
+    return version[0], str(graph.identifier), version[1], len(graph)
+
+
+def _counter(graph):
+    # [serial number, number of triples added] of the store of graph
+    store = graph.store
+    with _query_cache_lock:
+        version = _versions.get(store)
+        if version is None:
+            from rdflib.store import TripleAddedEvent
+            version = _versions[store] = [next(_serials), 0]
+
+            def added(event):
+                version[1] += 1
+            store.dispatcher.subscribe(TripleAddedEvent, added)
+    return version
+
+
+def _normalized(q):
+    # Query text with runs of whitespace outside string literals collapsed
+    return re.sub(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')|\s+', lambda m: m.group(1) or ' ', q).strip()